@@ -1,7 +1,22 @@
-import os, json, requests, psycopg2, datetime, time
+import os, re, json, requests, psycopg2, datetime, time
+import psycopg2.extras
+import asyncio
 import concurrent.futures
+import threading
+import functools
+import random
+import heapq
+import itertools
+import contextlib
+import gzip
+import collections
+import queue
+import signal
+import argparse
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse, parse_qs
-from http.server import BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import hashlib # Added for Amazon API
 import hmac     # Added for Amazon API
 
@@ -14,19 +29,100 @@ PINCODES_TO_CHECK = [p.strip() for p in PINCODES_STR.split(',') if p.strip()]
 
 # --- WHATSAPP CONFIG ---
 # Replace with your Cloudflare URL
-WHATSAPP_API_URL = "https://bituminous-ayden-estrous.ngrok-free.dev/whatsapp/send" 
+WHATSAPP_API_URL = os.getenv("WHATSAPP_API_URL", "https://bituminous-ayden-estrous.ngrok-free.dev/whatsapp/send")
 WHATSAPP_GROUP_NAME = os.getenv("WHATSAPP_GROUP_NAME", "Stock Alerts") 
+# Sends run on the dispatcher's own threads, so this no longer has to be tiny
+WHATSAPP_TIMEOUT = float(os.getenv("WHATSAPP_TIMEOUT", "5"))
 # -----------------------
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Set to 1 to refuse every database call (bench/ runs). An empty DATABASE_URL
+# isn't enough: libpq then falls back to the PG* environment variables.
+CHECK_DB_DISABLED = os.getenv("CHECK_DB_DISABLED", "0") == "1"
+# A warm connection idle for longer than this gets a SELECT 1 before reuse
+DB_HEALTHCHECK_INTERVAL = float(os.getenv("DB_HEALTHCHECK_INTERVAL", "30"))
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+# Bot API limits: 4096 chars per message, ~20 messages/minute per group, ~30/s overall
+TELEGRAM_MAX_MESSAGE_LENGTH = int(os.getenv("TELEGRAM_MAX_MESSAGE_LENGTH", "4096"))
+TELEGRAM_CHAT_RATE = (
+    float(os.getenv("TELEGRAM_CHAT_RPS", str(20 / 60))),
+    int(os.getenv("TELEGRAM_CHAT_BURST", "5")),
+)
+TELEGRAM_GLOBAL_RATE = (
+    float(os.getenv("TELEGRAM_GLOBAL_RPS", "30")),
+    int(os.getenv("TELEGRAM_GLOBAL_BURST", "30")),
+)
+# Attempts per message on 429/5xx before it is given up
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+
+# --- Notification Dispatcher ---
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "2"))
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "100"))
+# Max seconds main_logic waits for queued alerts before responding
+NOTIFY_FLUSH_TIMEOUT = float(os.getenv("NOTIFY_FLUSH_TIMEOUT", "15"))
 
 # Flipkart Proxy (AlwaysData)
-FLIPKART_PROXY_URL = "https://my-flipkart-worker.rahulhns41.workers.dev/flipkart_check"
+FLIPKART_PROXY_URL = os.getenv("FLIPKART_PROXY_URL", "https://my-flipkart-worker.rahulhns41.workers.dev/flipkart_check")
+# Max productIds sent to the proxy in one request. Batching is opt-in (>1)
+# until the proxy accepts the productIds list.
+FLIPKART_BATCH_SIZE = int(os.getenv("FLIPKART_BATCH_SIZE", "1"))
 # Reliance Digital Proxy (AlwaysData)
+RELIANCE_WORKER_URL = os.getenv("RELIANCE_WORKER_URL", "https://proxyrd.rahulhns41.workers.dev/")
 
 CRON_SECRET = os.getenv("CRON_SECRET")
 
+# --- Daemon Mode ---
+# `python -m api.check --daemon` runs checks in a loop in one warm process.
+# A tick starts when the next product is due, at most every DAEMON_MIN_TICK_SECONDS
+# and at least every DAEMON_MAX_SLEEP_SECONDS.
+DAEMON_PORT = int(os.getenv("DAEMON_PORT", "8080"))
+DAEMON_MIN_TICK_SECONDS = float(os.getenv("DAEMON_MIN_TICK_SECONDS", "15"))
+DAEMON_MAX_SLEEP_SECONDS = float(os.getenv("DAEMON_MAX_SLEEP_SECONDS", "60"))
+# Time budget per tick, so a slow store can't hold back the next tick's hot products
+DAEMON_RUN_BUDGET = float(os.getenv("DAEMON_RUN_BUDGET", "50"))
+# /healthz answers 503 until the first tick succeeds, when no tick has
+# succeeded for DAEMON_STALE_SECONDS, or after this many failed ticks in a row
+DAEMON_STALE_SECONDS = float(os.getenv("DAEMON_STALE_SECONDS", "300"))
+DAEMON_MAX_CONSECUTIVE_FAILURES = int(os.getenv("DAEMON_MAX_CONSECUTIVE_FAILURES", "3"))
+
+# --- Check Engine Concurrency ---
+# Global cap on in-flight checker calls across all stores, plus a per-store cap
+# so a single slow store can't starve the others.
+MAX_CONCURRENT_CHECKS = int(os.getenv("MAX_CONCURRENT_CHECKS", "32"))
+PER_STORE_CONCURRENCY = int(os.getenv("PER_STORE_CONCURRENCY", "8"))
+# --- Deadline Scheduling ---
+# Seconds held back from the run budget for sending alerts and the response.
+DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "3"))
+# Expected seconds per checker call until the engine has observed real ones
+# (per store in STORE_SPECS).
+DEFAULT_CHECK_COST = 2.0
+
+# Race mode checks all pincodes of a product at once and keeps the first hit.
+# PINCODE_RACE_WIDTH caps pincodes in flight per product (0 = all of them).
+PINCODE_RACE_MODE = os.getenv("PINCODE_RACE_MODE", "0") == "1"
+PINCODE_RACE_WIDTH = int(os.getenv("PINCODE_RACE_WIDTH", "0"))
+
+# --- Pincode Equivalence Classes ---
+# Pincodes that have always given the same answer at a store are checked
+# once per class; the other members get the representative's result.
+PINCODE_CLASSES_ENABLED = os.getenv("PINCODE_CLASSES_ENABLED", "1") == "1"
+PINCODE_CLASS_STORES = {
+    s.strip() for s in os.getenv("PINCODE_CLASS_STORES", "croma,flipkart,jiomart,oppo").split(",") if s.strip()
+}
+# Evidence needed before two pincodes are merged: matching answers overall,
+# and matching in-stock answers (everything agrees when everything is out of stock)
+PINCODE_CLASS_MIN_AGREE = int(os.getenv("PINCODE_CLASS_MIN_AGREE", "50"))
+PINCODE_CLASS_MIN_IN_STOCK = int(os.getenv("PINCODE_CLASS_MIN_IN_STOCK", "3"))
+# Share of disagreeing answers a merged pair may have
+PINCODE_CLASS_MAX_DISAGREE = float(os.getenv("PINCODE_CLASS_MAX_DISAGREE", "0.01"))
+# Share of checks that still query every pincode, to keep the evidence fresh
+PINCODE_CLASS_VERIFY_RATE = float(os.getenv("PINCODE_CLASS_VERIFY_RATE", "0.1"))
+# Seconds a (product, pincode class) answer is reused, across runs in the same
+# process. Capped below the daemon's shortest tick, so a tick never replays the
+# previous tick's answer and hides a transition.
+PINCODE_RESULT_TTL = min(float(os.getenv("PINCODE_RESULT_TTL", "10")), DAEMON_MIN_TICK_SECONDS / 2)
+
 # --- Amazon PAAPI Credentials ---
 AMAZON_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
 AMAZON_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -34,11 +130,15 @@ AMAZON_PARTNER_TAG = os.getenv("AMAZON_PARTNER_TAG")
 AMAZON_HOST = "webservices.amazon.in"
 AMAZON_REGION = "eu-west-1"
 AMAZON_SERVICE = "ProductAdvertisingAPI"
-AMAZON_ENDPOINT = "https://webservices.amazon.in/paapi5/getitems"
+AMAZON_ENDPOINT = os.getenv("AMAZON_ENDPOINT", "https://webservices.amazon.in/paapi5/getitems")
+# PAAPI accepts up to 10 ItemIds per GetItems call
+AMAZON_BATCH_SIZE = min(10, int(os.getenv("AMAZON_BATCH_SIZE", "10")))
 
 # --- OPPO Configuration ---
 # New API endpoint for serviceability check
-OPPO_SERVICEABILITY_URL = "https://opsg-gateway-in.oppo.com/v2/api/rest/mall/product/retail/store/fetch"
+OPPO_SERVICEABILITY_URL = os.getenv("OPPO_SERVICEABILITY_URL", "https://opsg-gateway-in.oppo.com/v2/api/rest/mall/product/retail/store/fetch")
+# Max SKUs sent in one serviceability request (the endpoint takes a skuCodes array)
+OPPO_BATCH_SIZE = int(os.getenv("OPPO_BATCH_SIZE", "20"))
 OPPO_BASE_HEADERS = {
     "Content-Type": "application/json",
     "client-version": "13.0.0.0",
@@ -51,6 +151,162 @@ OPPO_BASE_HEADERS = {
     "X-Requested-With": "XMLHttpRequest",
 }
 
+MOBILE_USER_AGENT = "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Mobile Safari/537.36"
+
+# --- Croma Configuration ---
+CROMA_INVENTORY_URL = os.getenv("CROMA_INVENTORY_URL", "https://api.croma.com/inventory/oms/v2/tms/details-pwa/")
+CROMA_HEADERS = {
+    "accept": "application/json",
+    "content-type": "application/json",
+    "oms-apim-subscription-key": "1131858141634e2abe2efb2b3a2a2a5d",
+    "origin": "https://www.croma.com",
+    "referer": "https://www.croma.com/",
+}
+
+# --- Jiomart Configuration ---
+JIOMART_PRODUCT_URL = os.getenv("JIOMART_PRODUCT_URL", "https://www.jiomart.com/catalog/productdetails/get/{product_id}")
+# The per-request 'pin' and 'referer' headers are added by the checker.
+JIOMART_HEADERS = {
+    "accept": "application/json, text/javascript, */*; q=0.01",
+    "user-agent": MOBILE_USER_AGENT,
+    "x-requested-with": "XMLHttpRequest",
+}
+
+# --- Vivo/iQOO Configuration ---
+VIVO_IQOO_BASE_URLS = {
+    "vivo": os.getenv("VIVO_BASE_URL", "https://mshop.vivo.com/in"),
+    "iqoo": os.getenv("IQOO_BASE_URL", "https://mshop.iqoo.com/in"),
+}
+VIVO_IQOO_HEADERS = {
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "User-Agent": "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Mobile Safari/5.36"
+}
+
+# --- Unicorn / Vijay Sales / Sangeetha Configuration ---
+# Unicorn products store their option ids ("<color>,<storage>") as productId;
+# the category/family/group ids select the iPhone 17 catalog.
+UNICORN_PRODUCT_URL = os.getenv("UNICORN_PRODUCT_URL", "https://fe01.beamcommerce.in/get_product_by_option_id")
+UNICORN_CATEGORY_ID = os.getenv("UNICORN_CATEGORY_ID", "456")
+UNICORN_FAMILY_ID = os.getenv("UNICORN_FAMILY_ID", "94")
+UNICORN_GROUP_IDS = os.getenv("UNICORN_GROUP_IDS", "57,58")
+# Vijay Sales products store their vanNo as productId. The serviceability
+# endpoint keys its answer by vanNo.
+VIJAY_SALES_SERVICEABILITY_URL = os.getenv(
+    "VIJAY_SALES_SERVICEABILITY_URL", "https://mdm.vijaysales.com/web/api/oms/check-servicibility/v1"
+)
+# vanNos per serviceability request. Batching (comma-separated vanNo) is opt-in
+# (>1) until the endpoint is confirmed to answer for every vanNo in the list.
+VIJAY_SALES_BATCH_SIZE = int(os.getenv("VIJAY_SALES_BATCH_SIZE", "1"))
+SANGEETHA_ETA_URL = os.getenv("SANGEETHA_ETA_URL", "https://www.sangeethamobiles.com/b/customer/api/v3/product-eta-details")
+# Sangeetha answers 500/404 for products it no longer sells; that is out of stock, not a failure
+SANGEETHA_OOS_STATUSES = (404, 500)
+UNICORN_HEADERS = {
+    "accept": "application/json, text/plain, */*",
+    "content-type": "application/json",
+    "customer-id": "unicorn",
+    "origin": "https://shop.unicornstore.in",
+    "referer": "https://shop.unicornstore.in/",
+}
+VIJAY_SALES_HEADERS = {
+    "accept": "*/*",
+    "origin": "https://www.vijaysales.com",
+    "referer": "https://www.vijaysales.com/",
+    "user-agent": (
+        "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142 Mobile Safari/537.36"
+    )
+}
+SANGEETHA_HEADERS = {
+    "accept": "application/json, text/plain, */*",
+    "content-type": "application/json",
+    "origin": "https://www.sangeethamobiles.com",
+    "referer": "https://www.sangeethamobiles.com/",
+    "user-agent": MOBILE_USER_AGENT,
+    "number1": "1",
+    "number2": "1",
+}
+
+# --- HTTP Session Pool ---
+# Max keep-alive connections kept open per store host.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+# --- Record / Replay ---
+# HTTP_RECORD_FILE appends every upstream exchange to a JSONL log (.gz to compress).
+# HTTP_REPLAY_FILE serves responses from such a log instead of the network,
+# with their original latency or, with HTTP_REPLAY_LATENCY=max, immediately.
+HTTP_RECORD_FILE = os.getenv("HTTP_RECORD_FILE")
+HTTP_REPLAY_FILE = os.getenv("HTTP_REPLAY_FILE")
+HTTP_REPLAY_LATENCY = os.getenv("HTTP_REPLAY_LATENCY", "original")
+
+# --- Rate Limiting & Retries ---
+def _store_rate_limit(env_prefix, rps, burst):
+    """Reads '<PREFIX>_RPS' / '<PREFIX>_BURST' overrides for a store's token bucket."""
+    return (float(os.getenv(f"{env_prefix}_RPS", rps)), int(os.getenv(f"{env_prefix}_BURST", burst)))
+
+# (requests per second, burst) for stores that don't declare one in STORE_SPECS
+DEFAULT_RATE_LIMIT = _store_rate_limit("DEFAULT", 5, 5)
+# Seconds, for stores that don't declare a timeout and calls that don't pass one
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("DEFAULT_REQUEST_TIMEOUT", "10"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+# Longer Retry-After waits are treated as a failed request instead
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "30"))
+# Seconds a run may take (0 = no limit). Retries never sleep past it.
+RUN_TIME_BUDGET = float(os.getenv("RUN_TIME_BUDGET", "0"))
+
+# --- Circuit Breakers ---
+# Consecutive failures (network errors, timeouts, final 502/503/504) before
+# an upstream host is cut off for the rest of the run.
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "1") == "1"
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Gateway errors mean the endpoint is down; a plain 500 can be a store's answer
+CIRCUIT_FAILURE_STATUS_CODES = {502, 503, 504}
+
+# --- Hedged Requests ---
+# Slow requests of idempotent stores (see STORE_SPECS) get a duplicate sent
+# after the endpoint's observed p90 latency; the first answer wins.
+# HEDGED_STORES narrows that to a comma-separated list ("none" disables it).
+HEDGED_STORES_OVERRIDE = os.getenv("HEDGED_STORES")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+# Max share of an endpoint's requests that may be hedged
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+# Latency samples needed before an endpoint is hedged at all
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+
+# --- Adaptive Timeouts ---
+# Request timeouts follow each endpoint's observed p99 × factor, clamped.
+# Call-site timeouts are only used until enough samples exist.
+ADAPTIVE_TIMEOUTS = os.getenv("ADAPTIVE_TIMEOUTS", "1") == "1"
+TIMEOUT_PERCENTILE = float(os.getenv("TIMEOUT_PERCENTILE", "0.99"))
+TIMEOUT_FACTOR = float(os.getenv("TIMEOUT_FACTOR", "3"))
+TIMEOUT_MIN_SECONDS = float(os.getenv("TIMEOUT_MIN_SECONDS", "2"))
+TIMEOUT_MAX_SECONDS = float(os.getenv("TIMEOUT_MAX_SECONDS", "30"))
+TIMEOUT_MIN_SAMPLES = int(os.getenv("TIMEOUT_MIN_SAMPLES", "20"))
+
+# --- Metrics ---
+# Latency histogram bucket bounds (seconds)
+METRIC_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25)
+METRIC_PREFIX = "stock_checker"
+# Request failures counted as timeouts
+TIMEOUT_ERRORS = {"Timeout", "ReadTimeout", "ConnectTimeout", "TimeoutError"}
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "64"))
+
+# Default headers set once on each host's session instead of on every call
+HOST_DEFAULT_HEADERS = {
+    "api.croma.com": CROMA_HEADERS,
+    "opsg-gateway-in.oppo.com": OPPO_BASE_HEADERS,
+    "www.jiomart.com": JIOMART_HEADERS,
+    "mshop.vivo.com": VIVO_IQOO_HEADERS,
+    "mshop.iqoo.com": VIVO_IQOO_HEADERS,
+    "fe01.beamcommerce.in": UNICORN_HEADERS,
+    "mdm.vijaysales.com": VIJAY_SALES_HEADERS,
+    "www.sangeethamobiles.com": SANGEETHA_HEADERS,
+}
+
 STORE_EMOJIS = {
     "croma": "🟢", "flipkart": "🟣", "amazon": "🟡",
     "unicorn": "🦄", "iqoo": "📱", "vivo": "🤳",
@@ -79,44 +335,1044 @@ STORE_TOPIC_IDS = {
 
 # --- END MODIFIED ---
 
-def send_whatsapp_message(message):
-    """Fires a POST request to the local WhatsApp API. No waiting for response."""
-    if not WHATSAPP_API_URL:
-        return
+# ==================================
+# 📊 METRICS
+# ==================================
+class Metrics:
+    """
+    Thread-safe counters and latency histograms keyed by name and labels.
+    Reset at the start of every run, so a snapshot describes that run.
+    """
+
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count], sum
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            counts, total = self.histograms.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+            counts[index] += 1
+            self.histograms[key] = (counts, total + seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Times a block into `<name>_duration_seconds`; exceptions count in `<name>_errors_total`."""
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.inc(f"{name}_errors_total", error=type(e).__name__, **labels)
+            raise
+        finally:
+            self.observe(f"{name}_duration_seconds", time.monotonic() - started, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """JSON-ready dump of every series, plus a per-store rollup. merge() accepts it back."""
+        with self.lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), "counts": list(counts), "sum": round(total, 4)}
+                for (name, labels), (counts, total) in sorted(self.histograms.items())
+            ]
+        return {
+            "stores": self.store_summary(),
+            "buckets": list(self.buckets),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def merge(self, snapshot):
+        """Adds another process's snapshot (e.g. a shard's) into this registry."""
+        if not snapshot:
+            return
+        if list(snapshot.get("buckets", [])) != list(self.buckets):
+            print("[warn] Skipping metrics snapshot with different histogram buckets.")
+            return
+        with self.lock:
+            for c in snapshot.get("counters", []):
+                key = self._key(c["name"], c["labels"])
+                self.counters[key] = self.counters.get(key, 0) + c["value"]
+            for h in snapshot.get("histograms", []):
+                key = self._key(h["name"], h["labels"])
+                counts, total = self.histograms.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+                self.histograms[key] = ([a + b for a, b in zip(counts, h["counts"])], total + h["sum"])
+
+    def store_summary(self):
+        """{store: {calls, errors, timeouts, seconds}} from the checker series, busiest store first."""
+        stores = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                store = dict(labels).get("store")
+                if store is None:
+                    continue
+                entry = stores.setdefault(store, {"calls": 0, "errors": 0, "timeouts": 0, "seconds": 0.0})
+                if name == "check_calls_total":
+                    entry["calls"] += value
+                elif name == "check_errors_total":
+                    entry["errors"] += value
+                elif name == "check_timeouts_total":
+                    entry["timeouts"] += value
+            for (name, labels), (_, total) in self.histograms.items():
+                store = dict(labels).get("store")
+                if name == "check_duration_seconds" and store in stores:
+                    stores[store]["seconds"] = round(stores[store]["seconds"] + total, 3)
+        return dict(sorted(stores.items(), key=lambda item: -item[1]["seconds"]))
+
+    def to_prometheus(self):
+        """Renders every series in the Prometheus text exposition format."""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                for k, v in pairs
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            full = f"{METRIC_PREFIX}_{name}"
+            if full not in typed:
+                lines.append(f"# TYPE {full} counter")
+                typed.add(full)
+            lines.append(f"{full}{fmt_labels(labels)} {value}")
+        for (name, labels), (counts, total) in histograms:
+            full = f"{METRIC_PREFIX}_{name}"
+            if full not in typed:
+                lines.append(f"# TYPE {full} histogram")
+                typed.add(full)
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f"{full}_bucket{fmt_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{full}_sum{fmt_labels(labels)} {round(total, 6)}")
+            lines.append(f"{full}_count{fmt_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def instrumented_call(store_type, pincode, checker_func, *args):
+    """call_with_outcome plus per-store/pincode call, error, timeout and latency metrics."""
+    started = time.monotonic()
+    try:
+        result, failed = call_with_outcome(checker_func, *args)
+    except Exception as e:
+        metrics.inc("check_calls_total", store=store_type, pincode=pincode, outcome="error")
+        metrics.inc("check_errors_total", store=store_type, pincode=pincode, error=type(e).__name__)
+        raise
+    finally:
+        metrics.observe("check_duration_seconds", time.monotonic() - started, store=store_type, pincode=pincode)
+
+    hit = any(result) if isinstance(result, list) else bool(result)
+    if failed:
+        error = last_request_error() or "RequestFailed"
+        metrics.inc("check_errors_total", store=store_type, pincode=pincode, error=error)
+        if error in TIMEOUT_ERRORS:
+            metrics.inc("check_timeouts_total", store=store_type, pincode=pincode)
+    outcome = "found" if hit else "error" if failed else "not_found"
+    metrics.inc("check_calls_total", store=store_type, pincode=pincode, outcome=outcome)
+    return result, failed
+
+# ==================================
+# 🌐 HTTP SESSION POOL
+# ==================================
+_sessions = {}
+_sessions_lock = threading.Lock()
+_request_counts = {}
+
+def get_session(url):
+    """Returns the shared keep-alive session for the URL's host, creating it on first use."""
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            if HTTP_REPLAY_FILE:
+                adapter = get_replay_adapter()
+            else:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HOST_DEFAULT_HEADERS.get(host, {}))
+            _sessions[host] = session
+        _request_counts[host] = _request_counts.get(host, 0) + 1
+    return session
+
+def http_request(store_type, method, url, **kwargs):
+    """
+    Sends a request for a store checker through the pooled session for its host.
+    Fails fast while the host's circuit is open, sets the timeout from the
+    host's observed latency, waits for the store's rate limiter, and retries
+    429/5xx responses with Retry-After or jittered exponential backoff while
+    the run budget allows. Statuses in `expected_statuses` are the store's
+    answer and come back as they are, without retries.
+    """
+    expected_statuses = kwargs.pop("expected_statuses", ())
+    limiter = get_rate_limiter(store_type)
+    breaker = get_circuit_breaker(url)
+    kwargs["timeout"] = request_timeout(url, kwargs.get("timeout") or store_timeout(store_type))
+    if not breaker.allow(max_wait=run_time_remaining()):
+        note_request_failure("CircuitOpen")
+        raise CircuitOpenError(f"Circuit open for {breaker.endpoint}, skipping {store_type} request")
+    attempt = 0
+    while True:
+        if not limiter.acquire(max_wait=run_time_remaining()):
+            breaker.abandon()
+            note_request_failure("RateLimitWait")
+            raise TimeoutError(f"{store_type} rate limit wait exceeds the run time budget")
+        try:
+            if store_type in HEDGED_STORES:
+                res = send_hedged(store_type, method, url, limiter, **kwargs)
+            else:
+                res = timed_request(store_type, method, url, **kwargs)
+        except Exception as e:
+            breaker.record_failure()
+            note_request_failure(type(e).__name__)
+            raise
+        if res.status_code not in RETRY_STATUS_CODES or res.status_code in expected_statuses:
+            breaker.record_success()
+            limiter.on_success()
+            if not 200 <= res.status_code < 300 and res.status_code not in expected_statuses:
+                # A 403 or error page says nothing about stock, so it can't read as "out of stock"
+                note_request_failure(f"HTTP{res.status_code}")
+            return res
+
+        if res.status_code in (429, 503):
+            limiter.on_throttle()
+
+        delay = retry_after_seconds(res)
+        if delay is None:
+            # Full jitter: anywhere between 0 and the exponential cap
+            delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+        if attempt >= HTTP_MAX_RETRIES or breaker.is_open() or delay > min(HTTP_RETRY_AFTER_MAX, run_time_remaining()):
+            print(f"[warn] {store_type} got {res.status_code} from {urlparse(url).netloc}, giving up after {attempt + 1} attempts")
+            if res.status_code in CIRCUIT_FAILURE_STATUS_CODES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            note_request_failure(f"HTTP{res.status_code}")
+            return res
+
+        print(f"[retry] {store_type} got {res.status_code}, retrying in {delay:.2f}s (attempt {attempt + 1}/{HTTP_MAX_RETRIES})")
+        time.sleep(delay)
+        attempt += 1
+
+# Checkers return None for both "out of stock" and "request failed". The
+# engine tells them apart through this per-thread flag, set on any network
+# error or final 429/5xx while the checker runs. The first error's class is
+# kept for metrics.
+_request_outcome = threading.local()
+
+def note_request_failure(error="RequestFailed"):
+    if not getattr(_request_outcome, "failed", False):
+        _request_outcome.error = error
+    _request_outcome.failed = True
+
+def note_item_failure(index, error="MissingResult"):
+    """Marks one product of a batch call as failed without failing the rest of the batch."""
+    failed_items = getattr(_request_outcome, "failed_items", None)
+    if failed_items is None:
+        # Checker called directly, outside call_with_outcome
+        failed_items = _request_outcome.failed_items = set()
+    if not getattr(_request_outcome, "failed", False) and not failed_items:
+        _request_outcome.error = error
+    failed_items.add(index)
+
+def last_request_error():
+    """Class name of the first request failure in the current checker call, or None."""
+    return getattr(_request_outcome, "error", None)
+
+def call_with_outcome(checker_func, *args):
+    """Runs a checker and returns (result, failed) where failed means an upstream request failed.
+
+    For a batch call where only some products failed, failed is a per-product list of bools.
+    """
+    _request_outcome.failed = False
+    _request_outcome.failed_items = set()
+    _request_outcome.error = None
+    result = checker_func(*args)
+    failed_items = _request_outcome.failed_items
+    if not _request_outcome.failed and failed_items and isinstance(result, list):
+        return result, [index in failed_items for index in range(len(result))]
+    return result, _request_outcome.failed
+
+def item_failed(failed, index):
+    """The failed flag of one product from a (possibly per-product) call outcome."""
+    return failed[index] if isinstance(failed, list) else failed
+
+def retry_after_seconds(res):
+    """Parses a Retry-After header (seconds or HTTP date). Returns None if absent or invalid."""
+    value = res.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
+# ==================================
+# 📼 RECORD / REPLAY
+# ==================================
+# Log lines are JSON objects: one {"type": "catalog"} line per recorded run
+# (products and pincodes) and one {"type": "exchange"} line per request.
+_record_lock = threading.Lock()
+_record_file = None
+_replay_adapter = None
+
+def open_log(path, mode):
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+def write_record(entry):
+    global _record_file
+    line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+    with _record_lock:
+        if _record_file is None:
+            _record_file = open_log(HTTP_RECORD_FILE, "a")
+        _record_file.write(line)
+        _record_file.flush()
+
+def close_record_log():
+    """Closes the record log, so a .gz log gets its trailer. The next write reopens it."""
+    global _record_file
+    with _record_lock:
+        if _record_file is not None:
+            _record_file.close()
+            _record_file = None
+
+def request_body(method, url, kwargs):
+    """The body requests would send for these kwargs, as text (the replay lookup key)."""
+    body = requests.Request(method, url, json=kwargs.get("json"), data=kwargs.get("data")).prepare().body
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    return body or ""
+
+def record_exchange(store_type, method, url, kwargs, latency, res=None, error=None):
+    if kwargs.get("params"):
+        # Key the exchange by the URL actually sent, as the replay adapter sees it
+        url = requests.Request(method, url, params=kwargs["params"]).prepare().url
+    entry = {
+        "type": "exchange",
+        "ts": round(time.time(), 3),
+        "store": store_type,
+        "method": method.upper(),
+        "url": url,
+        "body": request_body(method, url, kwargs),
+        "latency": round(latency, 4),
+    }
+    if res is not None:
+        entry.update({
+            "status": res.status_code,
+            "headers": dict(res.headers),
+            "response": res.content.decode("utf-8", errors="replace"),
+        })
+    else:
+        entry["error"] = type(error).__name__
     try:
-        # Convert Markdown links [Text](URL) -> Text: URL
-        # We use simple string replacement or regex if imported
-        import re
-        clean_message = re.sub(r'\[(.*?)\]\((.*?)\)', r'\1: \2', message)
+        write_record(entry)
+    except Exception as e:
+        print(f"[warn] Failed to record exchange for {url}: {e}")
+
+# Upstream URL settings saved with the catalog, so a replay requests the same URLs
+RECORDED_ENDPOINT_SETTINGS = [
+    "CROMA_INVENTORY_URL", "FLIPKART_PROXY_URL", "AMAZON_ENDPOINT", "RELIANCE_WORKER_URL",
+    "VIVO_IQOO_BASE_URLS", "OPPO_SERVICEABILITY_URL", "JIOMART_PRODUCT_URL",
+    "UNICORN_PRODUCT_URL", "VIJAY_SALES_SERVICEABILITY_URL", "SANGEETHA_ETA_URL",
+]
+
+def record_catalog(products, pincodes):
+    """Writes the run's products and endpoints to the record log so a replay can check the same catalog."""
+    keys = ("id", "name", "url", "productId", "storeType", "affiliateLink")
+    write_record({
+        "type": "catalog",
+        "ts": round(time.time(), 3),
+        "pincodes": list(pincodes),
+        "endpoints": {name: globals()[name] for name in RECORDED_ENDPOINT_SETTINGS},
+        "products": [{key: p.get(key) for key in keys} for p in products],
+    })
+
+def read_log(path):
+    with open_log(path, "r") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except EOFError:
+            # A process killed mid-run leaves a .gz log without its trailer
+            print(f"[warn] {path} is truncated, replaying what was flushed.")
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """
+    Transport adapter answering from a record log. Exchanges are matched on
+    method, URL and body (falling back to method and URL) and served in
+    recorded order; once a key's exchanges run out, its last one repeats.
+    """
 
-        payload = {
-            "group": WHATSAPP_GROUP_NAME,
-            "message": clean_message
+    def __init__(self, path, latency_mode=HTTP_REPLAY_LATENCY):
+        super().__init__()
+        self.latency_mode = latency_mode
+        self.exact = {}
+        self.loose = {}
+        self.lock = threading.Lock()
+        for entry in read_log(path):
+            if entry.get("type") != "exchange":
+                continue
+            self.exact.setdefault((entry["method"], entry["url"], entry["body"]), collections.deque()).append(entry)
+            self.loose.setdefault((entry["method"], entry["url"]), collections.deque()).append(entry)
+
+    def next_entry(self, method, url, body):
+        with self.lock:
+            for table, key in ((self.exact, (method, url, body)), (self.loose, (method, url))):
+                entries = table.get(key)
+                if entries:
+                    return entries.popleft() if len(entries) > 1 else entries[0]
+        return None
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = request.body.decode("utf-8", errors="replace") if isinstance(request.body, bytes) else (request.body or "")
+        entry = self.next_entry(request.method, request.url, body)
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"No recorded exchange for {request.method} {request.url}", request=request)
+
+        if self.latency_mode != "max":
+            read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+            if read_timeout is not None and entry["latency"] > read_timeout:
+                time.sleep(read_timeout)
+                raise requests.exceptions.ReadTimeout(f"Replayed latency exceeds {read_timeout}s", request=request)
+            time.sleep(entry["latency"])
+
+        if "error" in entry:
+            error_class = getattr(requests.exceptions, entry["error"], requests.exceptions.ConnectionError)
+            raise error_class(f"Replayed {entry['error']} for {request.url}", request=request)
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = requests.structures.CaseInsensitiveDict(entry.get("headers", {}))
+        # Recorded bodies are already decoded; don't let requests inflate them again
+        response.headers.pop("Content-Encoding", None)
+        response._content = entry.get("response", "").encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.reason = "Replayed"
+        return response
+
+    def close(self):
+        pass
+
+def get_replay_adapter():
+    global _replay_adapter
+    if _replay_adapter is None:
+        _replay_adapter = ReplayAdapter(HTTP_REPLAY_FILE)
+        print(f"[replay] Serving upstream responses from {HTTP_REPLAY_FILE} ({HTTP_REPLAY_LATENCY} latency)")
+    return _replay_adapter
+
+# ==================================
+# 🚦 RATE LIMITING
+# ==================================
+_run_deadline = None
+
+def set_run_deadline(deadline):
+    """Sets the wall-clock time (epoch seconds) the current run must finish by, or None."""
+    global _run_deadline
+    _run_deadline = deadline
+
+def run_time_remaining():
+    """Seconds left in the current run's budget (infinite when no deadline is set)."""
+    if _run_deadline is None:
+        return float("inf")
+    return max(0.0, _run_deadline - time.time())
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. The rate halves on throttling (down to 10% of
+    the configured rate) and recovers additively on successful responses.
+    """
+
+    def __init__(self, rate, burst):
+        self.max_rate = max(0.01, rate)
+        self.min_rate = self.max_rate * 0.1
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, max_wait=float("inf")):
+        """Takes one token, sleeping until it is available. Returns False if that would exceed max_wait."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0
+            if wait > max_wait:
+                return False
+            self.tokens -= 1  # Reserve now; a negative balance is our place in line
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+        print(f"[rate] Throttled, slowing down to {self.rate:.2f} req/s")
+
+    def on_success(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+# Share of each store's limit this process may use (1/shards in a sharded run)
+_rate_limit_scale = 1.0
+
+def set_rate_limit_scale(scale):
+    """Scales every store's rate and burst, e.g. by 1/shards so concurrent shards stay within the store's limit together."""
+    global _rate_limit_scale
+    with _rate_limiters_lock:
+        if scale != _rate_limit_scale:
+            _rate_limit_scale = scale
+            _rate_limiters.clear()
+
+def get_rate_limiter(store_type):
+    """Returns the token bucket for a store type, created from STORE_RATE_LIMITS on first use."""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(store_type)
+        if limiter is None:
+            rate, burst = STORE_RATE_LIMITS.get(store_type, DEFAULT_RATE_LIMIT)
+            limiter = TokenBucket(rate * _rate_limit_scale, max(1, int(burst * _rate_limit_scale)))
+            _rate_limiters[store_type] = limiter
+        return limiter
+
+def get_session_stats():
+    """Returns {host: {requests, connections, reused}} for every pooled session."""
+    stats = {}
+    with _sessions_lock:
+        for host, session in _sessions.items():
+            connections = 0
+            for adapter in set(session.adapters.values()):
+                if not hasattr(adapter, "poolmanager"):
+                    continue  # Replay adapter, no real connections
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        connections += pool.num_connections
+            requests_sent = _request_counts.get(host, 0)
+            stats[host] = {
+                "requests": requests_sent,
+                "connections": connections,
+                "reused": max(0, requests_sent - connections),
+            }
+    return stats
+
+# ==================================
+# 🔌 CIRCUIT BREAKERS
+# ==================================
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request to an endpoint whose circuit is open."""
+
+class CircuitBreaker:
+    """
+    Per-host breaker. Opens after CIRCUIT_FAILURE_THRESHOLD consecutive
+    failures and stays open for the rest of the run. The next run starts it
+    half-open: one probe request goes out while the others wait for its
+    outcome, which either closes the circuit or opens it again.
+    """
+
+    def __init__(self, endpoint, threshold=CIRCUIT_FAILURE_THRESHOLD):
+        self.endpoint = endpoint
+        self.threshold = max(1, threshold)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.used = False  # Touched this run; only these get persisted
+        self.cond = threading.Condition()
+
+    def allow(self, max_wait=float("inf")):
+        """Returns True if a request may go out. Half-open callers wait (up to max_wait) for the probe."""
+        if not CIRCUIT_BREAKER_ENABLED:
+            return True
+        deadline = time.time() + max_wait
+        with self.cond:
+            self.used = True
+            while True:
+                if self.state == "closed":
+                    return True
+                if self.state == "open":
+                    return False
+                if not self.probing:
+                    self.probing = True
+                    print(f"[circuit] Probing {self.endpoint} (half-open)")
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(None if remaining == float("inf") else remaining)
+
+    def record_success(self):
+        with self.cond:
+            if self.state != "closed":
+                print(f"[circuit] {self.endpoint} recovered, closing circuit")
+            self.state = "closed"
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+            self.cond.notify_all()
+
+    def record_failure(self):
+        with self.cond:
+            self.failures += 1
+            if self.state != "open" and (self.state == "half_open" or self.failures >= self.threshold):
+                print(f"[circuit] Opening circuit for {self.endpoint} after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = datetime.datetime.now(datetime.timezone.utc)
+            self.probing = False
+            self.cond.notify_all()
+
+    def abandon(self):
+        """Gives up a half-open probe that never reached the endpoint."""
+        with self.cond:
+            self.probing = False
+            self.cond.notify_all()
+
+    def is_open(self):
+        return CIRCUIT_BREAKER_ENABLED and self.state == "open"
+
+    def begin_run(self):
+        """Open circuits get a half-open probe at the start of every run."""
+        with self.cond:
+            if self.state == "open":
+                self.state = "half_open"
+            self.probing = False
+            self.used = False
+
+    def restore(self, state, failures, opened_at):
+        with self.cond:
+            self.state = state if state in ("closed", "open", "half_open") else "closed"
+            self.failures = failures
+            self.opened_at = opened_at
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+# When the current run loaded endpoint_health; circuits opened after this were opened by a concurrent shard
+_circuit_run_started = None
+
+def get_circuit_breaker(url):
+    """Returns the breaker for a URL's host (or a bare host name), created on first use."""
+    endpoint = urlparse(url).netloc or url
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(endpoint)
+            _circuit_breakers[endpoint] = breaker
+        return breaker
+
+def begin_circuit_run():
+    """Loads persisted breaker states and moves open circuits to half-open for this run."""
+    global _circuit_run_started
+    _circuit_run_started = datetime.datetime.now(datetime.timezone.utc)
+    if not CIRCUIT_BREAKER_ENABLED:
+        return
+    try:
+        with db_cursor("load_circuits") as cursor:
+            cursor.execute("SELECT endpoint, state, consecutive_failures, opened_at FROM endpoint_health")
+            for endpoint, state, failures, opened_at in cursor.fetchall():
+                get_circuit_breaker(endpoint).restore(state, failures, opened_at)
+    except Exception as e:
+        print(f"[error] Failed to load endpoint_health, using in-memory circuits: {e}")
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    for breaker in breakers:
+        breaker.begin_run()
+
+def save_circuit_states():
+    """
+    Persists the breakers used this run in one bulk upsert. Shards of one run
+    share endpoint_health, so a circuit another shard opened during this run
+    stays open; only circuits opened before the run can be closed by it.
+    """
+    with _circuit_breakers_lock:
+        rows = [
+            (b.endpoint, b.state, b.failures, b.opened_at)
+            for b in _circuit_breakers.values() if b.used
+        ]
+    if not rows:
+        return
+    with db_cursor("save_circuits") as cursor:
+        run_started = cursor.mogrify("%s", (_circuit_run_started,)).decode()
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO endpoint_health (endpoint, state, consecutive_failures, opened_at, updated_at) VALUES %s "
+            "ON CONFLICT (endpoint) DO UPDATE SET state = EXCLUDED.state, "
+            "consecutive_failures = EXCLUDED.consecutive_failures, opened_at = EXCLUDED.opened_at, "
+            "updated_at = EXCLUDED.updated_at "
+            "WHERE EXCLUDED.state = 'open' OR endpoint_health.state <> 'open' "
+            f"OR endpoint_health.opened_at IS NULL OR endpoint_health.opened_at < {run_started}",
+            rows,
+            template="(%s, %s, %s, %s, NOW())",
+            page_size=len(rows),
+        )
+
+def get_circuit_report():
+    """Returns {endpoint: {state, failures}} for the breakers used this run."""
+    with _circuit_breakers_lock:
+        return {
+            b.endpoint: {"state": b.state, "failures": b.failures}
+            for b in _circuit_breakers.values() if b.used
         }
+
+def circuit_summary_line(circuits):
+    """'Circuits: host open (5 failures), ...' for every circuit that isn't closed, or None."""
+    tripped = [
+        f"{endpoint} {c['state']} ({c['failures']} failures)"
+        for endpoint, c in circuits.items() if c["state"] != "closed"
+    ]
+    return "Circuits: " + ", ".join(tripped) if tripped else None
+
+# ==================================
+# 🪁 LATENCY TRACKING & HEDGED REQUESTS
+# ==================================
+_latencies = {}  # endpoint -> recent request latencies (seconds)
+_hedge_counts = {}  # endpoint -> [requests, hedges]
+_latency_dirty = set()  # endpoints with new samples since the last save
+_latency_lock = threading.Lock()
+_hedge_executor = None
+
+def record_latency(endpoint, seconds):
+    with _latency_lock:
+        samples = _latencies.get(endpoint)
+        if samples is None:
+            samples = _latencies[endpoint] = collections.deque(maxlen=LATENCY_WINDOW)
+        samples.append(seconds)
+        _latency_dirty.add(endpoint)
+
+def latency_percentile(endpoint, q, min_samples=1):
+    """The q-quantile (0..1) of an endpoint's recent latencies, or None with too few samples."""
+    with _latency_lock:
+        samples = sorted(_latencies.get(endpoint, ()))
+    if len(samples) < max(1, min_samples):
+        return None
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def timed_request(store_type, method, url, **kwargs):
+    """Sends one request through the pooled session and records its latency (and the exchange, when recording)."""
+    started = time.monotonic()
+    try:
+        res = get_session(url).request(method, url, **kwargs)
+    except requests.exceptions.Timeout as e:
+        # Count the time waited, so a slow spell pushes the timeout up instead of hiding
+        record_latency(urlparse(url).netloc, time.monotonic() - started)
+        if HTTP_RECORD_FILE:
+            record_exchange(store_type, method, url, kwargs, time.monotonic() - started, error=e)
+        raise
+    except Exception as e:
+        if HTTP_RECORD_FILE:
+            record_exchange(store_type, method, url, kwargs, time.monotonic() - started, error=e)
+        raise
+    record_latency(urlparse(url).netloc, time.monotonic() - started)
+    if HTTP_RECORD_FILE:
+        record_exchange(store_type, method, url, kwargs, time.monotonic() - started, res=res)
+    return res
+
+def request_timeout(url, default):
+    """Timeout for a request: the host's p99 latency × TIMEOUT_FACTOR, clamped, or `default` until warmed up."""
+    timeout = default
+    if ADAPTIVE_TIMEOUTS:
+        p99 = latency_percentile(urlparse(url).netloc, TIMEOUT_PERCENTILE, min_samples=TIMEOUT_MIN_SAMPLES)
+        if p99 is not None:
+            timeout = min(TIMEOUT_MAX_SECONDS, max(TIMEOUT_MIN_SECONDS, p99 * TIMEOUT_FACTOR))
+    # Never wait on a socket past the end of the run
+    remaining = run_time_remaining()
+    if timeout is not None and remaining != float("inf"):
+        timeout = max(1.0, min(timeout, remaining))
+    return timeout
+
+def load_latency_stats():
+    """Seeds the latency windows from endpoint_latency, for hosts this process hasn't seen yet."""
+    with db_cursor("load_latency") as cursor:
+        cursor.execute("SELECT endpoint, samples FROM endpoint_latency")
+        rows = cursor.fetchall()
+    with _latency_lock:
+        for endpoint, samples in rows:
+            if endpoint not in _latencies and samples:
+                _latencies[endpoint] = collections.deque(samples[-LATENCY_WINDOW:], maxlen=LATENCY_WINDOW)
+
+def save_latency_stats():
+    """Persists the latency window (plus p50/p90/p99 for reading) of every host with new samples."""
+    with _latency_lock:
+        endpoints = list(_latency_dirty)
+        _latency_dirty.clear()
+        windows = {endpoint: list(_latencies[endpoint]) for endpoint in endpoints}
+    rows = []
+    for endpoint, samples in windows.items():
+        p50, p90, p99 = (latency_percentile(endpoint, q) for q in (0.5, 0.9, 0.99))
+        rows.append((endpoint, samples, p50, p90, p99))
+    if not rows:
+        return
+    with db_cursor("save_latency") as cursor:
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO endpoint_latency (endpoint, samples, p50, p90, p99, updated_at) VALUES %s "
+            "ON CONFLICT (endpoint) DO UPDATE SET samples = EXCLUDED.samples, p50 = EXCLUDED.p50, "
+            "p90 = EXCLUDED.p90, p99 = EXCLUDED.p99, updated_at = EXCLUDED.updated_at",
+            rows,
+            template="(%s, %s::double precision[], %s, %s, %s, NOW())",
+            page_size=len(rows),
+        )
+
+def get_hedge_executor():
+    global _hedge_executor
+    with _latency_lock:
+        if _hedge_executor is None:
+            _hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _hedge_executor
+
+def take_hedge_slot(endpoint):
+    """Counts a request and returns True if a hedge for it stays under HEDGE_MAX_RATE."""
+    with _latency_lock:
+        counts = _hedge_counts.setdefault(endpoint, [0, 0])
+        if counts[1] + 1 > HEDGE_MAX_RATE * counts[0]:
+            return False
+        counts[1] += 1
+        return True
+
+def send_hedged(store_type, method, url, limiter, **kwargs):
+    """
+    Sends a request and, if it hasn't answered within the endpoint's p90
+    latency, a duplicate. Returns whichever response arrives first; the
+    loser is discarded when it finishes. Only for idempotent requests.
+    """
+    endpoint = urlparse(url).netloc
+    hedge_after = latency_percentile(endpoint, HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES)
+    with _latency_lock:
+        _hedge_counts.setdefault(endpoint, [0, 0])[0] += 1
+    if hedge_after is None:
+        return timed_request(store_type, method, url, **kwargs)
+
+    executor = get_hedge_executor()
+    pending = {executor.submit(timed_request, store_type, method, url, **kwargs)}
+    done, _ = concurrent.futures.wait(pending, timeout=hedge_after)
+    # The hedge also needs a free rate-limit token; it never waits for one
+    if not done and take_hedge_slot(endpoint):
+        if not limiter.acquire(max_wait=0):
+            with _latency_lock:
+                _hedge_counts[endpoint][1] -= 1
+            return pending.pop().result()
+        print(f"[hedge] {store_type} request to {endpoint} slower than {hedge_after:.2f}s, sending a duplicate")
+        pending.add(executor.submit(timed_request, store_type, method, url, **kwargs))
+
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.add_done_callback(discard_response)
+                return future.result()
+            error = future.exception()
+    raise error
+
+def discard_response(future):
+    """Releases the connection held by a hedged request that lost the race."""
+    if future.exception() is None:
+        future.result().close()
+
+# ==================================
+# 🧩 RUN-SCOPED REQUEST COALESCING
+# ==================================
+_run_cache = {}
+_run_cache_lock = threading.Lock()
+
+def reset_run_cache():
+    """Forgets every coalesced result. Called at the start of each run."""
+    with _run_cache_lock:
+        _run_cache.clear()
+
+def run_once(key, fetch_func, *args):
+    """
+    Runs fetch_func(*args) at most once per key per run and returns its result
+    (or re-raises its error). Concurrent callers wait on the in-flight call.
+    """
+    with _run_cache_lock:
+        future = _run_cache.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = concurrent.futures.Future()
+            _run_cache[key] = future
+
+    if is_owner:
+        try:
+            future.set_result(fetch_func(*args))
+        except Exception as e:
+            future.set_exception(e)
+    elif future.exception() is not None:
+        note_request_failure(type(future.exception()).__name__)  # The shared fetch failed for this caller too
+    return future.result()
+
+# Markdown links [Text](URL) -> Text: URL for WhatsApp
+MARKDOWN_LINK_PATTERN = re.compile(r'\[(.*?)\]\((.*?)\)')
+
+def markdown_to_plain(message):
+    return MARKDOWN_LINK_PATTERN.sub(r'\1: \2', message)
+
+def send_whatsapp_message(message):
+    """POSTs a message to the local WhatsApp API. Returns True if it was accepted; errors are logged, never raised."""
+    if not WHATSAPP_API_URL:
+        return False
+
+    outcome = "failed"
+    try:
+        with metrics.timer("notification", channel="whatsapp"):
+            payload = {
+                "group": WHATSAPP_GROUP_NAME,
+                "message": markdown_to_plain(message)
+            }
+            res = get_session(WHATSAPP_API_URL).post(WHATSAPP_API_URL, json=payload, timeout=WHATSAPP_TIMEOUT)
+            if res.ok:
+                outcome = "sent"
         
-        # Timeout=1 ensures we don't hang your script if the API is slow
-        requests.post(WHATSAPP_API_URL, json=payload, timeout=1)
-        
-    except Exception:
+    except Exception as e:
         # We explicitly ignore errors so the main script NEVER stops
-        pass
+        print(f"[warn] WhatsApp send failed: {e}")
+    metrics.inc("notifications_total", channel="whatsapp", outcome=outcome)
+    return outcome == "sent"
 
 # ==================================
 # 💬 TELEGRAM UTILITIES
 # ==================================
+def telegram_length(text):
+    """Message length as Telegram counts it (UTF-16 code units, so emoji count double)."""
+    return len(text.encode("utf-16-le")) // 2
+
+def split_oversized(text, limit):
+    """Splits one item longer than `limit` at line breaks (or hard cuts if a single line is too long)."""
+    pieces, current = [], ""
+    for line in text.split("\n"):
+        while telegram_length(line) > limit:
+            cut = limit
+            while telegram_length(line[:cut]) > limit:
+                cut -= 1
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:cut])
+            line = line[cut:]
+        candidate = f"{current}\n{line}" if current else line
+        if telegram_length(candidate) > limit:
+            pieces.append(current)
+            candidate = line
+        current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+def pack_messages(header, sections, limit=TELEGRAM_MAX_MESSAGE_LENGTH):
+    """
+    Packs alert items into as few messages as possible, each at most `limit`
+    long. `sections` is a list of (heading, items, separator); messages are only
+    split between items, every message starts with `header`, and a section
+    continued in a new message repeats its heading.
+    """
+    messages = []
+    current = header
+    current_section = None  # Index of the section the current message ends in
+
+    for section, (heading, items, separator) in enumerate(sections):
+        for item in items:
+            if current_section == section:
+                addition = separator + item
+            else:
+                addition = ("\n\n" if current != header else "") + heading + item
+            if telegram_length(current + addition) <= limit:
+                current += addition
+                current_section = section
+                continue
+
+            # Doesn't fit: close the current message and start a fresh one
+            if current != header:
+                messages.append(current)
+            current = header + heading
+            room = limit - telegram_length(current)
+            pieces = split_oversized(item, room) if telegram_length(item) > room else [item]
+            for piece in pieces[:-1]:
+                messages.append(current + piece)
+            current += pieces[-1]
+            current_section = section
+
+    if current != header:
+        messages.append(current)
+    return messages
+
+_telegram_limiters = {}
+_telegram_limiters_lock = threading.Lock()
+
+def get_telegram_limiter(chat_id):
+    """Returns the token bucket for a chat (or the bot-wide one for chat_id=None)."""
+    with _telegram_limiters_lock:
+        limiter = _telegram_limiters.get(chat_id)
+        if limiter is None:
+            rate, burst = TELEGRAM_GLOBAL_RATE if chat_id is None else TELEGRAM_CHAT_RATE
+            limiter = TokenBucket(rate, burst)
+            _telegram_limiters[chat_id] = limiter
+        return limiter
+
+def telegram_retry_after(res):
+    """Seconds Telegram asks us to wait, from the JSON body or the Retry-After header."""
+    try:
+        return float(res.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return retry_after_seconds(res)
+
 # --- MODIFIED: Function now accepts an optional thread_id ---
 def send_telegram_message(message, chat_id=TELEGRAM_GROUP_ID, thread_id=None):
-    """Sends a single message to a specified chat ID and optional topic thread."""
-    # 1. Fire to WhatsApp immediately
-    send_whatsapp_message(message)
-
-    
+    """
+    Sends a single message to a specified chat ID and optional topic thread,
+    pacing sends per chat and bot-wide and honouring retry_after on 429s.
+    Returns True once Telegram accepted the message.
+    """
     if not TELEGRAM_BOT_TOKEN or not chat_id:
         print(f"[warn] Missing Telegram config for chat {chat_id}.")
-        return
+        return False
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": message,
@@ -132,45 +1388,624 @@ def send_telegram_message(message, chat_id=TELEGRAM_GROUP_ID, thread_id=None):
             print(f"[warn] Invalid thread_id: {thread_id}. Sending to main group.")
     # --- END MODIFIED ---
 
-    try:
-        res = requests.post(url, json=payload, timeout=10)
-        if res.status_code != 200:
-            print(f"[warn] Telegram send failed to chat {chat_id} (Thread: {thread_id}): {res.text}")
-    except Exception as e:
-        print(f"[error] Telegram message error to chat {chat_id} (Thread: {thread_id}): {e}")
+    with metrics.timer("notification", channel="telegram"):
+        sent = deliver_telegram_payload(url, payload, chat_id, thread_id)
+    metrics.inc("notifications_total", channel="telegram", outcome="sent" if sent else "failed")
+    return sent
 # --- END MODIFIED ---
 
+def deliver_telegram_payload(url, payload, chat_id, thread_id):
+    """
+    Posts one sendMessage payload, pacing and retrying as described in
+    send_telegram_message. Never waits past the run deadline: a message that
+    can't go out in time is left undelivered (False) for the caller.
+    """
+    chat_limiter = get_telegram_limiter(chat_id)
+    global_limiter = get_telegram_limiter(None)
+    for attempt in range(TELEGRAM_MAX_RETRIES):
+        if not (chat_limiter.acquire(max_wait=run_time_remaining())
+                and global_limiter.acquire(max_wait=run_time_remaining())):
+            print(f"[warn] No Telegram send slot for chat {chat_id} before the run deadline.")
+            return False
+        try:
+            res = get_session(url).post(url, json=payload, timeout=10)
+        except Exception as e:
+            print(f"[error] Telegram message error to chat {chat_id} (Thread: {thread_id}): {e}")
+            delay = min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt)
+        else:
+            if res.status_code == 200:
+                return True
+            if res.status_code == 429:
+                # retry_after is exact, so wait it out rather than also slowing the bucket
+                metrics.inc("notification_throttled_total", channel="telegram")
+                delay = telegram_retry_after(res) or 1.0
+                print(f"[warn] Telegram rate limited chat {chat_id}, retrying in {delay:.0f}s.")
+            elif res.status_code >= 500:
+                delay = min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt)
+            else:
+                # Other 4xx (bad markdown, wrong chat...) won't succeed on retry
+                print(f"[warn] Telegram send failed to chat {chat_id} (Thread: {thread_id}): {res.text}")
+                return False
+
+        if attempt + 1 >= TELEGRAM_MAX_RETRIES:
+            break
+        if delay > run_time_remaining():
+            print(f"[warn] Telegram retry for chat {chat_id} would end after the run deadline, leaving it undelivered.")
+            return False
+        time.sleep(delay)
+
+    print(f"[error] Giving up on Telegram message to chat {chat_id} (Thread: {thread_id}) after {TELEGRAM_MAX_RETRIES} attempts.")
+    return False
+
+def send_in_order(send_func, messages, *args):
+    """
+    Sends the parts of one alert one after another so they arrive in order.
+    Returns the parts that didn't go out, so the caller can leave their
+    products unsaved (see delivered_state_rows) and alert them again.
+    """
+    return [message for message in messages if not send_func(message, *args)]
+
+# ==================================
+# 📣 NOTIFICATION DISPATCHER
+# ==================================
+class NotificationDispatcher:
+    """
+    Bounded queue drained by a small pool of daemon threads, so checks only
+    enqueue alerts and never wait on Telegram/WhatsApp.
+    """
+
+    def __init__(self, workers=NOTIFY_WORKERS, queue_size=NOTIFY_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name="notify-worker", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _worker(self):
+        while True:
+            send_func, args, future = self.queue.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue  # Cancelled by delivered_state_rows after the flush
+                future.set_result(send_func(*args))
+            except Exception as e:
+                print(f"[error] Notification send failed: {e}")
+                future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def submit(self, send_func, *args):
+        """
+        Queues one send and returns a Future for send_func's return value.
+        Never blocks (it runs on the event loop): when the queue is full the
+        send is dropped and the Future fails with queue.Full.
+        """
+        self._ensure_started()
+        future = concurrent.futures.Future()
+        try:
+            self.queue.put_nowait((send_func, args, future))
+        except queue.Full as e:
+            print(f"[warn] Notification queue full ({self.queue.maxsize}), dropping a send.")
+            metrics.inc("notifications_dropped_total")
+            future.set_exception(e)
+        return future
+
+    def flush(self, timeout):
+        """Waits up to `timeout` seconds for queued sends. Returns True if everything went out."""
+        deadline = time.time() + max(0.0, timeout)
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    print(f"[warn] {self.queue.unfinished_tasks} notifications still pending after flush timeout.")
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+notification_dispatcher = NotificationDispatcher()
+
+def send_alert(messages, chat_id=TELEGRAM_GROUP_ID, thread_id=None):
+    """
+    Queues a message (or the parts from pack_messages) for WhatsApp and Telegram
+    without blocking the caller. Returns one Future per channel, each resolving
+    to the parts that channel didn't deliver.
+    """
+    if isinstance(messages, str):
+        messages = [messages]
+    return [
+        notification_dispatcher.submit(send_in_order, send_whatsapp_message, messages),
+        notification_dispatcher.submit(send_in_order, send_telegram_message, messages, chat_id, thread_id),
+    ]
+
 # ==================================
 # 🗄️ DATABASE
 # ==================================
-def get_products_from_db():
+# One connection per process, kept open across warm serverless invocations
+_db_conn = None
+_db_last_used = 0.0
+_db_lock = threading.RLock()
+
+def get_db_connection():
+    """Returns the warm connection, reconnecting if it was closed or fails its health check."""
+    global _db_conn, _db_last_used
+    if CHECK_DB_DISABLED:
+        raise RuntimeError("Database access is disabled (CHECK_DB_DISABLED=1)")
+    if _db_conn is not None and not _db_conn.closed:
+        if time.time() - _db_last_used < DB_HEALTHCHECK_INTERVAL:
+            return _db_conn
+        try:
+            with _db_conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            _db_last_used = time.time()
+            return _db_conn
+        except psycopg2.Error as e:
+            print(f"[warn] Warm database connection failed health check, reconnecting: {e}")
+            close_db_connection()
+
     print("[info] Connecting to database...")
-    conn = psycopg2.connect(DATABASE_URL)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name, url, product_id, store_type, affiliate_link FROM products")
-    products = cursor.fetchall()
-    conn.close()
+    _db_conn = psycopg2.connect(DATABASE_URL, connect_timeout=10, keepalives=1, keepalives_idle=30)
+    _db_conn.autocommit = True
+    _db_last_used = time.time()
+    return _db_conn
+
+def close_db_connection():
+    global _db_conn
+    if _db_conn is not None:
+        try:
+            _db_conn.close()
+        except psycopg2.Error:
+            pass
+    _db_conn = None
+
+@contextlib.contextmanager
+def db_cursor(operation="query"):
+    """
+    Yields a cursor on the warm connection. Connection-level errors drop it so
+    the next call reconnects. Time and errors are recorded under `operation`.
+    """
+    global _db_last_used
+    with _db_lock, metrics.timer("db", operation=operation):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            _db_last_used = time.time()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            close_db_connection()
+            raise
+
+def get_products_from_db(shard=None, shards=None, store_types=None):
+    """
+    Loads due products, optionally only those of `store_types` and those in
+    shard `shard` of `shards` (stable: id mod shards). Filtering happens in SQL.
+    """
+    # Only products due by their adaptive schedule (all of them when disabled).
+    # Least recently checked first, so products skipped at the last deadline go first.
+    conditions, params = [], []
+    if store_types is not None:
+        conditions.append("store_type = ANY(%s)")
+        params.append(list(store_types))
+    if ADAPTIVE_POLLING:
+        conditions.append("(next_check_at IS NULL OR next_check_at <= NOW() + make_interval(secs => %s))")
+        params.append(POLL_DUE_GRACE_SECONDS)
+    if shards:
+        # A product keeps its shard when others are added or removed
+        conditions.append("MOD(id, %s) = %s")
+        params.extend([shards, shard])
+    with db_cursor("load_products") as cursor:
+        cursor.execute(
+            "SELECT id, name, url, product_id, store_type, affiliate_link, last_checked_at, "
+            "poll_interval_seconds, volatility FROM products "
+            + ("WHERE " + " AND ".join(conditions) + " " if conditions else "") +
+            "ORDER BY last_checked_at ASC NULLS FIRST, id",
+            params,
+        )
+        products = cursor.fetchall()
 
     products_list = [
         {
-            "name": row[0],
-            "url": row[1],
-            "productId": row[2],
-            "storeType": row[3],
-            "affiliateLink": row[4],
+            "id": row[0],
+            "name": row[1],
+            "url": row[2],
+            "productId": row[3],
+            "storeType": row[4],
+            "affiliateLink": row[5],
+            "lastCheckedAt": row[6],
+            "pollInterval": row[7],
+            "volatility": row[8],
         }
         for row in products
     ]
     print(f"[info] Loaded {len(products_list)} products from database.")
     return products_list
 
+def seconds_until_next_due(store_types):
+    """Seconds until the earliest product of `store_types` is due (0 if one already is), or None without products."""
+    with db_cursor("next_due") as cursor:
+        cursor.execute(
+            "SELECT EXTRACT(EPOCH FROM MIN(COALESCE(next_check_at, NOW())) - NOW()) FROM products "
+            "WHERE store_type = ANY(%s)",
+            (list(store_types),),
+        )
+        seconds = cursor.fetchone()[0]
+    return None if seconds is None else max(0.0, float(seconds))
+
+def save_check_schedule(rows):
+    """
+    Stamps last_checked_at and the next adaptive check time on every product the
+    run finished checking. rows are (id, poll_interval_seconds, volatility); one UPDATE.
+    """
+    if not rows:
+        return
+    with db_cursor("save_schedule") as cursor:
+        psycopg2.extras.execute_values(
+            cursor,
+            "UPDATE products AS p SET last_checked_at = NOW(), "
+            "next_check_at = NOW() + make_interval(secs => v.poll_interval), "
+            "poll_interval_seconds = v.poll_interval, volatility = v.volatility "
+            "FROM (VALUES %s) AS v (id, poll_interval, volatility) WHERE p.id = v.id",
+            rows,
+            template="(%s, %s::int, %s::float8)",
+            page_size=len(rows),
+        )
+
+# ==================================
+# ⏱️ ADAPTIVE POLLING
+# ==================================
+# Products that changed recently or are in stock are polled every tick; quiet
+# out-of-stock ones back off exponentially from POLL_BACKOFF_START_SECONDS up
+# to POLL_MAX_INTERVAL_SECONDS, which bounds how late a restock can be alerted.
+ADAPTIVE_POLLING = os.getenv("ADAPTIVE_POLLING", "1") == "1"
+POLL_MIN_INTERVAL_SECONDS = int(os.getenv("POLL_MIN_INTERVAL_SECONDS", "0"))
+POLL_BACKOFF_START_SECONDS = int(os.getenv("POLL_BACKOFF_START_SECONDS", "300"))
+POLL_BACKOFF_FACTOR = float(os.getenv("POLL_BACKOFF_FACTOR", "2"))
+POLL_MAX_INTERVAL_SECONDS = int(os.getenv("POLL_MAX_INTERVAL_SECONDS", "1800"))
+# Volatility is a moving average of "changed" per check; above this a product stays hot
+POLL_HOT_VOLATILITY = float(os.getenv("POLL_HOT_VOLATILITY", "0.05"))
+# Products due within this many seconds are picked up by the current tick
+POLL_DUE_GRACE_SECONDS = int(os.getenv("POLL_DUE_GRACE_SECONDS", "30"))
+
+def next_poll_interval(product, changed, in_stock=False):
+    """
+    Returns (poll_interval_seconds, volatility) for a checked product.
+    changed is True/False, or None when the outcome was inconclusive.
+    In-stock products never back off, so selling out is noticed promptly.
+    """
+    interval = product.get("pollInterval") or 0
+    volatility = product.get("volatility") or 0.0
+    if changed is None:
+        return interval, volatility
+
+    volatility = 0.8 * volatility + (0.2 if changed else 0.0)
+    if changed or in_stock or volatility >= POLL_HOT_VOLATILITY:
+        return POLL_MIN_INTERVAL_SECONDS, volatility
+
+    backed_off = max(POLL_BACKOFF_START_SECONDS, int(interval * POLL_BACKOFF_FACTOR))
+    return min(POLL_MAX_INTERVAL_SECONDS, backed_off), volatility
+
+# ==================================
+# 📈 STOCK STATE (TRANSITION ALERTS)
+# ==================================
+# Set to 0 to go back to alerting on every in-stock product every run
+STOCK_STATE_ENABLED = os.getenv("STOCK_STATE_ENABLED", "1") == "1"
+PRICE_PATTERN = re.compile(r"Price: ₹\s*([\d,]+(?:\.\d+)?)")
+
+def load_stock_state(product_ids):
+    """Returns {product_id: {pincode: (in_stock, price)}} for the given products."""
+    state = {}
+    if not product_ids:
+        return state
+    with db_cursor("load_stock_state") as cursor:
+        cursor.execute(
+            "SELECT product_id, pincode, in_stock, price FROM stock_state WHERE product_id = ANY(%s)",
+            (list(product_ids),),
+        )
+        for product_id, pincode, in_stock, price in cursor.fetchall():
+            state.setdefault(product_id, {})[pincode] = (in_stock, price)
+    return state
+
+def save_stock_state(rows):
+    """Writes (product_id, pincode, in_stock, price) rows back in one bulk upsert."""
+    # One row per key, or Postgres rejects the ON CONFLICT update
+    rows = list({(row[0], row[1]): row for row in rows}.values())
+    if not rows:
+        return
+    with db_cursor("save_stock_state") as cursor:
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO stock_state (product_id, pincode, in_stock, price, updated_at) VALUES %s "
+            "ON CONFLICT (product_id, pincode) DO UPDATE SET "
+            "in_stock = EXCLUDED.in_stock, price = EXCLUDED.price, updated_at = EXCLUDED.updated_at",
+            rows,
+            template="(%s, %s, %s, %s, NOW())",
+            page_size=len(rows),
+        )
+    print(f"[info] Saved {len(rows)} stock_state rows.")
+
+def extract_price(message):
+    """Pulls the '💰 Price: ₹...' amount out of a checker message, or None."""
+    match = PRICE_PATTERN.search(message or "")
+    return match.group(1).replace(",", "") if match else None
+
+def stock_transition(product, message, observations, previous):
+    """
+    Compares one product's outcome this run with its stored per-pincode state.
+    Returns (alert, out_notice, rows, conclusive): the alert text for a restock
+    or price change, the out-of-stock notice, the stock_state rows to upsert,
+    and whether the product's status is actually known this run.
+    """
+    rows = [
+        (product["id"], pincode, False, None)
+        for pincode, observed, failed in observations
+        if not observed and not failed
+    ]
+    was_in_stock = any(in_stock for in_stock, _ in previous.values())
+
+    if message:
+        pincode = next((pincode for pincode, observed, _ in observations if observed), "")
+        price = extract_price(message)
+        rows.append((product["id"], pincode, True, price))
+        if not was_in_stock:
+            return message, None, rows, True
+        old_in_stock, old_price = previous.get(pincode, (False, None))
+        if old_in_stock and price and old_price and price != old_price:
+            return message + f"\n💸 Price changed: ₹{old_price} → ₹{price}", None, rows, True
+        return None, None, rows, True
+
+    # Out of stock only counts when every checked request actually answered
+    conclusive = bool(observations) and not any(failed for _, _, failed in observations)
+    if conclusive and was_in_stock:
+        return None, f"[{product['name']}]({product['affiliateLink'] or product['url']})", rows, True
+    return None, None, rows, conclusive
+
+def apply_stock_transitions(engine, products, results):
+    """
+    Splits a store's results into (alerts, out-of-stock notices, held) and queues
+    the stock_state rows of unchanged products on the engine. held pairs each
+    alert or notice with its rows, which are only saved once it is delivered
+    (see delivered_state_rows). Without stored state every hit is alerted.
+    """
+    alerts, gone, held = [], [], []
+    for product, message in zip(products, results):
+        if engine.previous_state is None or product.get("id") is None:
+            if message:
+                alerts.append(message)
+            continue
+        if id(product) in engine.skipped_products and not message:
+            continue
+        alert, out_notice, rows, conclusive = stock_transition(
+            product, message, engine.observations_for(product), engine.previous_state.get(product["id"], {})
+        )
+        engine.changes[id(product)] = bool(alert or out_notice) if conclusive else None
+        if alert or out_notice:
+            held.append((alert or out_notice, rows))
+        else:
+            engine.state_rows.extend(rows)
+        if alert:
+            alerts.append(alert)
+        if out_notice:
+            gone.append(out_notice)
+    return alerts, gone, held
+
+def alert_state_rows(futures, parts, held):
+    """(rows, undelivered count) for one queued alert, from the sends that finished."""
+    undelivered = set(parts)
+    for future in futures:
+        if future.done() and not future.cancelled() and future.exception() is None:
+            undelivered &= set(future.result())
+    delivered = [part for part in parts if part not in undelivered]
+    rows, held_back = [], 0
+    for item, item_rows in held:
+        if any(item in part for part in delivered):
+            rows.extend(item_rows)
+        else:
+            held_back += 1
+    return rows, held_back
+
+def save_late_delivery(futures, parts, held, _finished):
+    """Done-callback for a send still running after the flush: saves the alert's rows once every send is over."""
+    if not all(future.done() for future in futures):
+        return
+    rows, _ = alert_state_rows(futures, parts, held)
+    try:
+        save_stock_state(rows)
+    except Exception as e:
+        print(f"[error] Failed to save stock_state after a late delivery: {e}")
+
+def delivered_state_rows(pending_alerts):
+    """
+    stock_state rows of alerted products whose alert went out on at least one
+    channel; call it once the flush is over. pending_alerts holds (futures
+    from send_alert, parts, held) per queued alert. Sends that haven't started
+    are cancelled, so they can't go out after the run and then again next run;
+    their products keep the stored state and are alerted next run. Sends
+    already in progress save their rows themselves when they finish.
+    """
+    rows, held_back, late = [], 0, 0
+    for futures, parts, held in pending_alerts:
+        for future in futures:
+            future.cancel()  # Only succeeds for sends still waiting in the queue
+        running = [future for future in futures if not future.done()]
+        if running:
+            late += 1
+            for future in running:
+                future.add_done_callback(functools.partial(save_late_delivery, futures, parts, held))
+            continue
+        alert_rows, missed = alert_state_rows(futures, parts, held)
+        rows.extend(alert_rows)
+        held_back += missed
+    if held_back:
+        print(f"[warn] {held_back} stock changes weren't delivered, they will be alerted again next run.")
+    if late:
+        print(f"[warn] {late} alerts still sending after the flush, their stock changes are saved when they finish.")
+    return rows
+
+# ==================================
+# 🏘️ PINCODE EQUIVALENCE CLASSES
+# ==================================
+# (store_type, productId, pincode) -> (expires_at, message), shared across runs
+_pincode_results = {}
+_pincode_results_lock = threading.Lock()
+
+def get_cached_pincode_result(store_type, product_id, pincode):
+    """Returns (message, False) answered within PINCODE_RESULT_TTL, like run_check, or None."""
+    with _pincode_results_lock:
+        entry = _pincode_results.get((store_type, product_id, pincode))
+    if entry is None or entry[0] < time.time():
+        return None
+    return entry[1], False
+
+def cache_pincode_result(store_type, product_id, pincode, message):
+    if PINCODE_RESULT_TTL <= 0:
+        return
+    with _pincode_results_lock:
+        _pincode_results[(store_type, product_id, pincode)] = (time.time() + PINCODE_RESULT_TTL, message)
+
+def prune_pincode_results():
+    """Drops expired answers so a long-lived process doesn't keep every product forever."""
+    now = time.time()
+    with _pincode_results_lock:
+        for key in [key for key, (expires_at, _) in _pincode_results.items() if expires_at < now]:
+            del _pincode_results[key]
+
+def load_pincode_agreement():
+    """Returns {(store_type, pincode_a, pincode_b): [agree, agree_in_stock, disagree]}."""
+    with db_cursor("load_pincode_agreement") as cursor:
+        cursor.execute(
+            "SELECT store_type, pincode_a, pincode_b, agree, agree_in_stock, disagree FROM pincode_agreement"
+        )
+        return {(store, a, b): [agree, in_stock, disagree] for store, a, b, agree, in_stock, disagree in cursor.fetchall()}
+
+def save_pincode_agreement(deltas):
+    """Adds this run's counts to pincode_agreement in one bulk upsert."""
+    rows = [(*key, *counts) for key, counts in deltas.items()]
+    if not rows:
+        return
+    with db_cursor("save_pincode_agreement") as cursor:
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO pincode_agreement (store_type, pincode_a, pincode_b, agree, agree_in_stock, disagree, updated_at) "
+            "VALUES %s ON CONFLICT (store_type, pincode_a, pincode_b) DO UPDATE SET "
+            "agree = pincode_agreement.agree + EXCLUDED.agree, "
+            "agree_in_stock = pincode_agreement.agree_in_stock + EXCLUDED.agree_in_stock, "
+            "disagree = pincode_agreement.disagree + EXCLUDED.disagree, updated_at = EXCLUDED.updated_at",
+            rows,
+            template="(%s, %s, %s, %s, %s, %s, NOW())",
+            page_size=len(rows),
+        )
+
+class PincodeClasses:
+    """
+    Groups a store's pincodes into classes that have always answered alike,
+    from the pincode_agreement history. The engine checks one representative
+    per class and gives its answer to the other members. A share of checks
+    still query every pincode; their answers (and any split they reveal)
+    feed back into the history.
+    """
+
+    def __init__(self, agreement=None, stores=PINCODE_CLASS_STORES, verify_rate=PINCODE_CLASS_VERIFY_RATE):
+        self.agreement = agreement or {}
+        self.stores = stores
+        self.verify_rate = verify_rate
+        self.deltas = {}
+        # (store_type, tuple(pincodes)) -> [[representative, *members], ...]
+        self.classes = {}
+        # (store_type, id(product)) -> {pincode: in_stock} for answers actually fetched this run
+        self.answers = {}
+
+    def applies(self, store_type):
+        return store_type in self.stores
+
+    @staticmethod
+    def pair_key(store_type, a, b):
+        return (store_type, a, b) if a <= b else (store_type, b, a)
+
+    def equivalent(self, store_type, a, b):
+        agree, agree_in_stock, disagree = self.agreement.get(self.pair_key(store_type, a, b), (0, 0, 0))
+        return (
+            agree >= PINCODE_CLASS_MIN_AGREE
+            and agree_in_stock >= PINCODE_CLASS_MIN_IN_STOCK
+            and disagree <= PINCODE_CLASS_MAX_DISAGREE * (agree + disagree)
+        )
+
+    def partition(self, store_type, pincodes):
+        """Splits pincodes into classes of mutually equivalent ones; each class is led by its first pincode."""
+        key = (store_type, tuple(pincodes))
+        if key not in self.classes:
+            groups = []
+            for pincode in pincodes:
+                group = next(
+                    (g for g in groups if self.applies(store_type) and all(self.equivalent(store_type, pincode, m) for m in g)),
+                    None,
+                )
+                if group is None:
+                    groups.append([pincode])
+                else:
+                    group.append(pincode)
+            self.classes[key] = groups
+        return self.classes[key]
+
+    def plan(self, store_type, pincodes):
+        """
+        Returns (pincodes to query, {representative: [members]}, verify).
+        When verifying, every pincode is queried and none stops the others.
+        """
+        if not self.applies(store_type):
+            return list(pincodes), {}, False
+        if random.random() < self.verify_rate:
+            return list(pincodes), {}, True
+        groups = self.partition(store_type, pincodes)
+        return [g[0] for g in groups], {g[0]: g[1:] for g in groups if len(g) > 1}, False
+
+    def record(self, store_type, product, pincode, in_stock):
+        """Counts one fetched answer against the product's other answers from this run."""
+        answers = self.answers.setdefault((store_type, id(product)), {})
+        if pincode in answers:
+            return
+        for other, other_in_stock in answers.items():
+            key = self.pair_key(store_type, pincode, other)
+            agree = in_stock == other_in_stock
+            delta = (int(agree), int(agree and in_stock), int(not agree))
+            for table in (self.agreement, self.deltas):
+                counts = table.setdefault(key, [0, 0, 0])
+                for i, amount in enumerate(delta):
+                    counts[i] += amount
+            if not agree:
+                # Regroup this store with the new evidence for the rest of the run
+                self.classes = {k: v for k, v in self.classes.items() if k[0] != store_type}
+        answers[pincode] = in_stock
+
+    def report(self, pincodes):
+        """{store_type: [[representative, *members], ...]} for stores where some pincodes merged."""
+        report = {}
+        for store_type in sorted(self.stores):
+            groups = self.partition(store_type, pincodes)
+            if len(groups) < len(pincodes):
+                report[store_type] = groups
+        return report
+
+def pincode_class_summary_line(report, pincodes):
+    if not report:
+        return None
+    parts = [f"{store_type} {len(pincodes)}→{len(groups)}" for store_type, groups in report.items()]
+    return "Pincode classes: " + ", ".join(parts)
+
 # ==================================
 # 🔑 AMAZON V4 SIGNATURE HELPERS
 # ==================================
 def sign(key, msg):
     return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
 
+@functools.lru_cache(maxsize=8)
 def getSignatureKey(key, dateStamp, regionName, serviceName):
+    """Derives the SigV4 signing key. Cached, since it only changes with the date stamp."""
     kDate = sign(('AWS4' + key).encode('utf-8'), dateStamp)
     kRegion = sign(kDate, regionName)
     kService = sign(kRegion, serviceName)
@@ -178,6 +2013,12 @@ def getSignatureKey(key, dateStamp, regionName, serviceName):
     return kSigning
 
 
+def chunked(items, size):
+    """Splits a list into consecutive chunks of at most `size` items."""
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 def extract_sku_id(url):
     """Parses the 'skuId' query parameter from a given URL."""
     try:
@@ -195,62 +2036,48 @@ def extract_sku_id(url):
 # ==================================
 
 # --- Unicorn Checker (API - OK) ---
-def check_unicorn_product(color_name, color_id, storage_id):
-    """Checks stock for a single iPhone 17 (256GB) variant at Unicorn Store."""
-    
-    BASE_URL = "https://fe01.beamcommerce.in/get_product_by_option_id"
-    HEADERS = {
-        "accept": "application/json, text/plain, */*",
-        "content-type": "application/json",
-        "customer-id": "unicorn",
-        "origin": "https://shop.unicornstore.in",
-        "referer": "https://shop.unicornstore.in/",
-    }
-    
-    CATEGORY_ID = "456" 
-    FAMILY_ID = "94"
-    GROUP_IDS = "57,58"
-    
-    variant_name = f"iPhone 17 {color_name} 256GB"
-    
+def fetch_unicorn_option(option_ids):
+    """Fetches one option combination. Products sharing option ids share the call (see run_once)."""
     payload = {
-        "category_id": CATEGORY_ID,
-        "family_id": FAMILY_ID,
-        "group_ids": GROUP_IDS,
-        "option_ids": f"{color_id},{storage_id}"
+        "category_id": UNICORN_CATEGORY_ID,
+        "family_id": UNICORN_FAMILY_ID,
+        "group_ids": UNICORN_GROUP_IDS,
+        "option_ids": option_ids,
     }
+    res = http_request("unicorn", "POST", UNICORN_PRODUCT_URL, json=payload)
+    res.raise_for_status()
+    return res.json()
 
+def check_unicorn_product(product):
+    """Checks stock for one Unicorn Store variant, identified by its option ids."""
+    option_ids = product["productId"].replace(" ", "")
     try:
-        res = requests.post(BASE_URL, headers=HEADERS, json=payload, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-        
+        data = run_once(("unicorn", option_ids), fetch_unicorn_option, option_ids)
+
         product_data = data.get("data", {}).get("product", {})
         quantity = product_data.get("quantity", 0)
-        
+
         price = f"₹{int(product_data.get('price', 0)):,}" if product_data.get('price') else "N/A"
         sku = product_data.get("sku", "N/A")
-        product_url = "https://shop.unicornstore.in/iphone-17" 
-        
+
         if int(quantity) > 0:
-            print(f"[UNICORN] ✅ {variant_name} is IN STOCK ({quantity} units)")
+            print(f"[UNICORN] ✅ {product['name']} is IN STOCK ({quantity} units)")
             return (
-                f"[{variant_name} - {sku}]({product_url})"
+                f"[{product['name']} - {sku}]({product['affiliateLink'] or product['url']})"
                 f"\n💰 Price: {price}, Qty: {quantity}"
             )
-        else:
-            dispatch_note = product_data.get("custom_column_4", "Out of Stock").strip()
-            print(f"[UNICORN] ❌ {variant_name} unavailable: {dispatch_note}")
-            
+        dispatch_note = (product_data.get("custom_column_4") or "Out of Stock").strip()
+        print(f"[UNICORN] ❌ {product['name']} unavailable: {dispatch_note}")
+
     except Exception as e:
-        print(f"[error] Unicorn check failed for {variant_name}: {e}")
-    
+        print(f"[error] Unicorn check failed for {product['name']}: {e}")
+        note_request_failure(type(e).__name__)
+
     return None
 
 # --- Croma Checker (API - OK) ---
 def check_croma_product(product, pincode):
     """Checks stock for a single Croma product at one pincode."""
-    url = "https://api.croma.com/inventory/oms/v2/tms/details-pwa/"
     payload = {
         "promise": {
             "allocationRuleID": "SYSTEM",
@@ -271,16 +2098,9 @@ def check_croma_product(product, pincode):
             },
         }
     }
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "oms-apim-subscription-key": "1131858141634e2abe2efb2b3a2a2a5d",
-        "origin": "https://www.croma.com",
-        "referer": "https://www.croma.com/",
-    }
 
     try:
-        res = requests.post(url, headers=headers, json=payload, timeout=10)
+        res = http_request("croma", "POST", CROMA_INVENTORY_URL, json=payload)
         data = res.json()
 
         lines = (
@@ -298,68 +2118,84 @@ def check_croma_product(product, pincode):
         print(f"[CROMA] ❌ {product['name']} unavailable at {pincode}")
     except Exception as e:
         print(f"[error] Croma check failed for {product['name']}: {e}")
+        note_request_failure(type(e).__name__)
     return None
 
-def check_flipkart_product(product, pincode):
-    """Checks stock for a single Flipkart product at one pincode via proxy."""
-    try:
-        payload = {"productId": product["productId"], "pincode": pincode}
-        res = requests.post(FLIPKART_PROXY_URL, json=payload, timeout=25)
+# --- Flipkart Proxy Checker (Batched productIds + Pincode) ---
+# Proxy protocol:
+#   single: {"productId": "<id>", "pincode": "<pin>"}
+#   batch:  {"productIds": ["<id>", ...], "pincode": "<pin>"}
+# Both reply with {"RESPONSE": {"<id>": {"listingSummary": {...}}, ...}}.
+def check_flipkart_batch(products, pincode):
+    """
+    Checks many Flipkart products at one pincode via the proxy, sending up to
+    FLIPKART_BATCH_SIZE productIds per request. Returns one message-or-None per product, in order.
+    """
+    results = [None] * len(products)
+    indexed = list(enumerate(products))
 
-        if res.status_code != 200:
-            print(f"[FLIPKART] ⚠️ Proxy failed ({res.status_code}) for {product['name']}")
-            return None
+    for batch in chunked(indexed, FLIPKART_BATCH_SIZE):
+        product_ids = list(dict.fromkeys(product["productId"] for _, product in batch))
+        if len(product_ids) == 1:
+            payload = {"productId": product_ids[0], "pincode": pincode}
+        else:
+            payload = {"productIds": product_ids, "pincode": pincode}
 
-        data = res.json()
-        response = data.get("RESPONSE", {}).get(product["productId"], {})
-        listing = response.get("listingSummary", {})
+        try:
+            res = http_request("flipkart", "POST", FLIPKART_PROXY_URL, json=payload)
 
-        # FULL REAL LOGIC
-        serviceable = listing.get("serviceable", False)
-        available = listing.get("available", False)
+            if res.status_code != 200:
+                print(f"[FLIPKART] ⚠️ Proxy failed ({res.status_code}) for {len(product_ids)} products at {pincode}")
+                for index, _ in batch:
+                    note_item_failure(index, f"HTTP{res.status_code}")
+                continue
 
-        if serviceable and available:
-            price = listing.get("pricing", {}).get("finalPrice", {}).get("decimalValue", None)
-            print(f"[FLIPKART] ✅ {product['name']} deliverable to {pincode}")
-            return (
-                f"[{product['name']}]({product['affiliateLink'] or product['url']})\n"
-                f"📍 Pincode: {pincode}"
-                + (f", 💰 Price: ₹{price}" if price else "")
-            )
-
-        print(f"[FLIPKART] ❌ {product['name']} not available or not deliverable at {pincode}")
-        return None
+            # One parse of the multi-product RESPONSE for the whole batch
+            responses = res.json().get("RESPONSE", {})
+        except Exception as e:
+            print(f"[error] Flipkart proxy check failed for {', '.join(product_ids)}: {e}")
+            for index, _ in batch:
+                note_item_failure(index, type(e).__name__)
+            continue
+
+        for index, product in batch:
+            response = responses.get(product["productId"])
+            if response is None:
+                # No entry for this productId is an unknown result, not out of stock
+                print(f"[FLIPKART] ⚠️ No result for {product['name']} at {pincode}")
+                note_item_failure(index)
+                continue
+            results[index] = flipkart_listing_message(product, pincode, response)
+
+    return results
+
+def flipkart_listing_message(product, pincode, response):
+    """Turns one product's proxy RESPONSE entry into an alert message, or None."""
+    listing = response.get("listingSummary", {})
+
+    # FULL REAL LOGIC
+    serviceable = listing.get("serviceable", False)
+    available = listing.get("available", False)
+
+    if serviceable and available:
+        price = listing.get("pricing", {}).get("finalPrice", {}).get("decimalValue", None)
+        print(f"[FLIPKART] ✅ {product['name']} deliverable to {pincode}")
+        return (
+            f"[{product['name']}]({product['affiliateLink'] or product['url']})\n"
+            f"📍 Pincode: {pincode}"
+            + (f", 💰 Price: ₹{price}" if price else "")
+        )
 
-    except Exception as e:
-        print(f"[error] Flipkart proxy check failed for {product['name']}: {e}")
-        return None
+    print(f"[FLIPKART] ❌ {product['name']} not available or not deliverable at {pincode}")
+    return None
 
 # --- Amazon API Checker (PAAPI v5) ---
-def check_amazon_api(product):
-    """Checks Amazon stock using the direct PAAPI v5."""
-    asin = product["productId"]
-    print(f"[AMAZON_API] Checking: {asin}")
-
-    if not all([AMAZON_ACCESS_KEY, AMAZON_SECRET_KEY, AMAZON_PARTNER_TAG]):
-        print("[error] Amazon API credentials (KEY, SECRET, TAG) are not set.")
-        return None
-
+def build_amazon_headers(payload_str):
+    """Builds the SigV4-signed headers for a PAAPI GetItems request body."""
     t = datetime.datetime.utcnow()
     amz_date = t.strftime('%Y%m%dT%H%M%SZ')
     date_stamp = t.strftime('%Y%m%d')
 
-    payload = {
-        "ItemIds": [asin],
-        "PartnerTag": AMAZON_PARTNER_TAG,
-        "PartnerType": "Associates",
-        "Marketplace": "www.amazon.in",
-        "Resources": [
-            "OffersV2.Listings.Availability",
-            "ItemInfo.Title"
-        ]
-    }
-    payload_str = json.dumps(payload)
-
     method = 'POST'
     target = 'com.amazon.paapi5.v1.ProductAdvertisingAPIv1.GetItems'
     content_type = 'application/json; charset=UTF-8'
@@ -403,7 +2239,7 @@ def check_amazon_api(product):
         f'Signature={signature}'
     )
 
-    headers = {
+    return {
         'Content-Type': content_type,
         'X-Amz-Date': amz_date,
         'X-Amz-Target': target,
@@ -412,34 +2248,81 @@ def check_amazon_api(product):
         'Host': AMAZON_HOST
     }
 
-    try:
-        res = requests.post(AMAZON_ENDPOINT, data=payload_str, headers=headers, timeout=10)
-        res.raise_for_status()
-        data = res.json()
+def check_amazon_batch(products):
+    """
+    Checks Amazon stock for many products with batched PAAPI v5 GetItems calls
+    (up to AMAZON_BATCH_SIZE ASINs each). Returns one message-or-None per product, in order.
+    """
+    results = [None] * len(products)
+    if not all([AMAZON_ACCESS_KEY, AMAZON_SECRET_KEY, AMAZON_PARTNER_TAG]):
+        print("[error] Amazon API credentials (KEY, SECRET, TAG) are not set.")
+        note_request_failure("MissingCredentials")
+        return results
 
-        item = data.get("ItemsResult", {}).get("Items", [{}])[0]
-        listing = item.get("OffersV2", {}).get("Listings", [{}])[0]
-        availability = listing.get("Availability", {})
-        availability_message = availability.get("Message", "Status Unknown")
-        availability_type = availability.get("Type", "OUT_OF_STOCK")
+    indexed = list(enumerate(products))
+    for batch in chunked(indexed, AMAZON_BATCH_SIZE):
+        asins = list(dict.fromkeys(product["productId"] for _, product in batch))
+        print(f"[AMAZON_API] Checking {len(asins)} ASINs: {', '.join(asins)}")
 
-        if availability_type == "IN_STOCK" or "in stock" in availability_message.lower():
-            product_title = item.get("ItemInfo", {}).get("Title", {}).get("DisplayValue", product["name"])
-            print(f"[AMAZON_API] ✅ {product_title} is IN STOCK")
-            return (
-                f"[{product_title}]({product['affiliateLink'] or product['url']})\n"
-                f"💰 Price: N/A (Price check removed)"
-            )
-        else:
-            print(f"[AMAZON_API] ❌ {product['name']} is {availability_message}")
-            return None
+        payload = {
+            "ItemIds": asins,
+            "PartnerTag": AMAZON_PARTNER_TAG,
+            "PartnerType": "Associates",
+            "Marketplace": "www.amazon.in",
+            "Resources": [
+                "OffersV2.Listings.Availability",
+                "ItemInfo.Title"
+            ]
+        }
+        payload_str = json.dumps(payload)
 
-    except Exception as e:
-        print(f"[error] Amazon API check failed for {asin}: {e}")
-        if hasattr(e, 'response') and e.response:
-            print(f"[error] Amazon Response: {e.response.text}")
-        return None
-RELIANCE_WORKER_URL = "https://proxyrd.rahulhns41.workers.dev/"
+        try:
+            res = http_request("amazon", "POST", AMAZON_ENDPOINT, data=payload_str, headers=build_amazon_headers(payload_str))
+            res.raise_for_status()
+            data = res.json()
+        except Exception as e:
+            print(f"[error] Amazon API check failed for {', '.join(asins)}: {e}")
+            if hasattr(e, 'response') and e.response:
+                print(f"[error] Amazon Response: {e.response.text}")
+            for index, _ in batch:
+                note_item_failure(index, type(e).__name__)
+            continue
+
+        # Invalid/inaccessible ASINs come back under "Errors" and are simply missing here
+        items_by_asin = {
+            item.get("ASIN"): item for item in (data.get("ItemsResult") or {}).get("Items") or []
+        }
+        for error in data.get("Errors") or []:
+            print(f"[AMAZON_API] ⚠️ {error.get('Code')}: {error.get('Message')}")
+
+        for index, product in batch:
+            item = items_by_asin.get(product["productId"])
+            if not item:
+                # Not returned is an unknown result, not out of stock
+                print(f"[AMAZON_API] ⚠️ {product['name']} not returned by PAAPI")
+                note_item_failure(index)
+                continue
+            results[index] = amazon_item_message(product, item)
+
+    return results
+
+def amazon_item_message(product, item):
+    """Turns one PAAPI ItemsResult entry into an alert message, or None if out of stock."""
+    listing = (item.get("OffersV2", {}).get("Listings") or [{}])[0]
+    availability = listing.get("Availability", {})
+    availability_message = availability.get("Message", "Status Unknown")
+    availability_type = availability.get("Type", "OUT_OF_STOCK")
+
+    if availability_type == "IN_STOCK" or "in stock" in availability_message.lower():
+        product_title = item.get("ItemInfo", {}).get("Title", {}).get("DisplayValue", product["name"])
+        print(f"[AMAZON_API] ✅ {product_title} is IN STOCK")
+        return (
+            f"[{product_title}]({product['affiliateLink'] or product['url']})\n"
+            f"💰 Price: N/A (Price check removed)"
+        )
+
+    print(f"[AMAZON_API] ❌ {product['name']} is {availability_message}")
+    return None
 
 def check_reliance_digital_product(product, pincode):
     try:
@@ -448,21 +2331,24 @@ def check_reliance_digital_product(product, pincode):
             "pincode": pincode
         }
 
-        res = requests.post(
-            "https://proxyrd.rahulhns41.workers.dev/",
+        res = http_request(
+            "reliance_digital",
+            "POST",
+            RELIANCE_WORKER_URL,
             json=payload,
             headers={"X-Bypass": str(time.time())},  # Prevent Cloudflare caching
-            timeout=25
         )
 
         if res.status_code != 200:
             print("[RD] Error:", res.status_code, res.text)
+            note_request_failure(f"HTTP{res.status_code}")
             return None
 
         try:
             data = res.json()
-        except Exception:
+        except Exception as e:
             print("[RD] JSON Parse Error:", res.text)
+            note_request_failure(type(e).__name__)
             return None
 
         print("[RD] available:", data.get("available"))
@@ -473,30 +2359,43 @@ def check_reliance_digital_product(product, pincode):
                 f"📍 Pincode: {pincode}"
             )
 
-        return data
+        return None
 
     except Exception as e:
         print("[RD] Worker failed:", e)
+        note_request_failure(type(e).__name__)
         return None
-# --- iQOO API Checker Wrapper ---
-def check_iqoo_api(product):
-    """Checks iQOO stock for the specific SKU ID in the URL."""
-    return check_vivo_iqoo_api(product, "iqoo")
+# --- Vivo/iQOO CORE API Checker (MODIFIED TO CHECK SPECIFIC SKU) ---
+def fetch_vivo_iqoo_sku_index(store_type, product_id):
+    """
+    Downloads activityInfo for one SPU and returns a {skuId: sku} dict.
+    Called through run_once, so every tracked SKU of an SPU shares one fetch per run.
+    """
+    store_url_base = VIVO_IQOO_BASE_URLS[store_type] # Build base URL
+    API_URL = f"{store_url_base}/api/product/activityInfo/all/{product_id}"
+    headers = {"Referer": f"{store_url_base}/product/{product_id}"}
 
-# --- Vivo API Checker Wrapper ---
-def check_vivo_api(product):
-    """Checks Vivo stock for the specific SKU ID in the URL."""
-    return check_vivo_iqoo_api(product, "vivo")
+    print(f"[{store_type.upper()}_API] Fetching SPU={product_id}")
+    res = http_request(store_type, "GET", API_URL, headers=headers)
+    res.raise_for_status()
+    data = res.json()
+
+    if data.get("success") != "1" or "data" not in data:
+        raise ValueError("API success was not '1'.")
+
+    sku_list = data.get("data", {}).get("activitySkuList", [])
+    if not sku_list:
+        raise ValueError("No SKU list found in response.")
+
+    # Ensure lookups are with a string
+    return {str(sku.get("skuId")): sku for sku in sku_list}
 
-# --- Vivo/iQOO CORE API Checker (MODIFIED TO CHECK SPECIFIC SKU) ---
 def check_vivo_iqoo_api(product, store_type):
     """
     Checks stock for a *specific* SKU variant within a product.
     store_type should be 'vivo' or 'iqoo'.
     """
     product_id = product["productId"] # This is the SPU ID
-    store_url_base = f"https://mshop.{store_type}.com/in" # Build base URL
-    API_URL = f"{store_url_base}/api/product/activityInfo/all/{product_id}"
     
     # 1. Extract the specific SKU ID we are tracking
     target_sku_id = extract_sku_id(product["url"])
@@ -506,115 +2405,99 @@ def check_vivo_iqoo_api(product, store_type):
         
     print(f"[{store_type.upper()}_API] Checking: SPU={product_id}, Target SKU={target_sku_id}")
 
-    headers = {
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": f"{store_url_base}/product/{product_id}",
-        "User-Agent": "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Mobile Safari/5.36"
-    }
-
     try:
-        res = requests.get(API_URL, headers=headers, timeout=10)
-        res.raise_for_status()
-        data = res.json()
-
-        if data.get("success") != "1" or "data" not in data:
-            print(f"[{store_type.upper()}_API] ❌ {product['name']} failed. API success was not '1'.")
-            return None
-
-        sku_list = data.get("data", {}).get("activitySkuList", [])
-        if not sku_list:
-            print(f"[{store_type.upper()}_API] ❌ {product['name']} - No SKU list found in response.")
-            return None
-
-        is_in_stock = False
-        product_title = product["name"]
-        
-        # 2. Iterate and check ONLY the target SKU ID
-        for sku in sku_list:
-            sku_id_from_api = str(sku.get("skuId")) # Ensure comparison is with a string
-            
-            if sku_id_from_api == target_sku_id:
-                reservable_id = sku.get("activityInfo", {}).get("reservableId")
-                
-                # Optional: Refine the product name for the alert
-                color_name = sku.get("colorName", "")
-                rom_name = sku.get("romName", "")
-                if color_name and rom_name:
-                    product_title = f"{product['name']} ({color_name} / {rom_name})"
-                elif color_name:
-                    product_title = f"{product['name']} ({color_name})"
-                
-                # The core logic check for specific SKU
-                if reservable_id == -1:
-                    is_in_stock = True
-                    break  # Found the target SKU and it's in stock
-                else:
-                    # Found the target SKU, but it's OOS, stop checking
-                    break
-        
-        # 3. Report result for the specific SKU
-        if is_in_stock:
-            print(f"[{store_type.upper()}_API] ✅ {product_title} is IN STOCK")
-            return (
-                f"[{product_title}]({product['affiliateLink'] or product['url']})\n"
-                f"💰 Price: N/A (API doesn't show price)"
-            )
-        else:
-            # Report OOS/SKU not found status
-            print(f"[{store_type.upper()}_API] ❌ {product['name']} (SKU {target_sku_id}) is Out of Stock.")
-            return None
-            
+        sku_index = run_once((store_type, "spu", product_id), fetch_vivo_iqoo_sku_index, store_type, product_id)
     except Exception as e:
         print(f"[error] {store_type.upper()} API check failed for {product_id} / {target_sku_id}: {e}")
+        note_request_failure(type(e).__name__)
         return None
+
+    is_in_stock = False
+    product_title = product["name"]
+
+    # 2. Look up ONLY the target SKU ID
+    sku = sku_index.get(target_sku_id)
+    if sku:
+        reservable_id = sku.get("activityInfo", {}).get("reservableId")
+
+        # Optional: Refine the product name for the alert
+        color_name = sku.get("colorName", "")
+        rom_name = sku.get("romName", "")
+        if color_name and rom_name:
+            product_title = f"{product['name']} ({color_name} / {rom_name})"
+        elif color_name:
+            product_title = f"{product['name']} ({color_name})"
+
+        # The core logic check for specific SKU
+        is_in_stock = reservable_id == -1
+
+    # 3. Report result for the specific SKU
+    if is_in_stock:
+        print(f"[{store_type.upper()}_API] ✅ {product_title} is IN STOCK")
+        return (
+            f"[{product_title}]({product['affiliateLink'] or product['url']})\n"
+            f"💰 Price: N/A (API doesn't show price)"
+        )
+
+    # Report OOS/SKU not found status
+    print(f"[{store_type.upper()}_API] ❌ {product['name']} (SKU {target_sku_id}) is Out of Stock.")
+    return None
 # --- END MODIFIED VIVO/IQOO CHECKERS ---
 
 
-# --- MODIFIED: OPPO Serviceability Checker (Uses SKU + Pincode) ---
-# ... (the rest of your script continues here)
-# --- MODIFIED: OPPO Serviceability Checker (Uses SKU + Pincode) ---
-def check_oppo_product(product, pincode):
-    """Checks OPPO serviceability for exact SKU at a specific pincode."""
-    sku = product["productId"]
-    print(f"[OPPO] Checking SKU: {sku} at Pincode: {pincode}")
+# --- OPPO Serviceability Checker (Batched SKUs + Pincode) ---
+def check_oppo_batch(products, pincode):
+    """
+    Checks OPPO serviceability for many exact SKUs at one pincode, sending up to
+    OPPO_BATCH_SIZE skuCodes per request. Returns one message-or-None per product, in order.
+    """
+    results = [None] * len(products)
+    indexed = list(enumerate(products))
 
-    payload = {
-        "pincode": str(pincode),
-        "skuCodes": [sku],
-        "storeViewCode": "in",
-        "configModule": 3,
-        "settleChannel": 3
-    }
+    for batch in chunked(indexed, OPPO_BATCH_SIZE):
+        skus = list(dict.fromkeys(product["productId"] for _, product in batch))
+        print(f"[OPPO] Checking {len(skus)} SKUs at Pincode: {pincode}")
 
-    try:
-        # Use the dedicated serviceability URL and headers
-        res = requests.post(OPPO_SERVICEABILITY_URL, json=payload, headers=OPPO_BASE_HEADERS, timeout=15)
-        res.raise_for_status()
-        data = res.json()
-        
-        products_data = data.get("data", {}).get("products", [])
-        
-        is_available = False
-        for product_data in products_data:
-            if product_data.get("skuCode") == sku:
-                # deliveryOnlineSupport is true if in stock AND deliverable
-                is_available = product_data.get("deliveryOnlineSupport", False)
-                break
-        
-        if is_available:
-            print(f"[OPPO] ✅ {product['name']} deliverable to {pincode}")
-            return (
-                f"[{product['name']}]({product['affiliateLink'] or product['url']})\n"
-                f"📍 Pincode: {pincode}"
-            )
+        payload = {
+            "pincode": str(pincode),
+            "skuCodes": skus,
+            "storeViewCode": "in",
+            "configModule": 3,
+            "settleChannel": 3
+        }
 
-        print(f"[OPPO] ❌ {product['name']} not deliverable at {pincode}")
-        return None
+        try:
+            # Use the dedicated serviceability URL and headers
+            res = http_request("oppo", "POST", OPPO_SERVICEABILITY_URL, json=payload)
+            res.raise_for_status()
+            data = res.json()
+        except Exception as e:
+            print(f"[error] OPPO serviceability check failed for {', '.join(skus)} at {pincode}: {e}")
+            for index, _ in batch:
+                note_item_failure(index, type(e).__name__)
+            continue
+
+        # deliveryOnlineSupport is true if in stock AND deliverable
+        available_by_sku = {
+            product_data.get("skuCode"): product_data.get("deliveryOnlineSupport", False)
+            for product_data in (data.get("data") or {}).get("products") or []
+        }
 
-    except Exception as e:
-        print(f"[error] OPPO serviceability check failed for {sku} at {pincode}: {e}")
-        return None
+        for index, product in batch:
+            if product["productId"] not in available_by_sku:
+                # Not covered by the answer (or "data": null) is unknown, not undeliverable
+                print(f"[OPPO] ⚠️ No answer for {product['name']} at {pincode}")
+                note_item_failure(index)
+            elif available_by_sku[product["productId"]]:
+                print(f"[OPPO] ✅ {product['name']} deliverable to {pincode}")
+                results[index] = (
+                    f"[{product['name']}]({product['affiliateLink'] or product['url']})\n"
+                    f"📍 Pincode: {pincode}"
+                )
+            else:
+                print(f"[OPPO] ❌ {product['name']} not deliverable at {pincode}")
+
+    return results
 
 # --- NEW: Jiomart Checker ---
 def check_jiomart_product(product, pincode):
@@ -622,25 +2505,23 @@ def check_jiomart_product(product, pincode):
     product_id = product["productId"]
     print(f"[JIOMART] Checking Product: {product_id} at Pincode: {pincode}")
 
-    url = f"https://www.jiomart.com/catalog/productdetails/get/{product_id}"
+    url = JIOMART_PRODUCT_URL.format(product_id=product_id)
     
     # Jiomart uses the 'pin' in the header for the check
     headers = {
-        "accept": "application/json, text/javascript, */*; q=0.01",
-        "user-agent": "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Mobile Safari/537.36",
-        "x-requested-with": "XMLHttpRequest",
         "pin": str(pincode),
         # Use the stored URL for a more accurate referrer, falling back to a generic one
         "referer": product['url'] or f"https://www.jiomart.com/p/generic/{product_id}" 
     }
 
     try:
-        res = requests.get(url, headers=headers, timeout=15)
+        res = http_request("jiomart", "GET", url, headers=headers)
         res.raise_for_status()
         r = res.json()
 
         if r.get("status") != "success":
             print(f"[JIOMART] ❌ {product['name']} failed API response: {r.get('status')}")
+            note_request_failure("BadStatus")
             return None
 
         data = r.get("data", {})
@@ -665,382 +2546,934 @@ def check_jiomart_product(product, pincode):
 
     except Exception as e:
         print(f"[error] Jiomart check failed for {product_id} at {pincode}: {e}")
+        note_request_failure(type(e).__name__)
         return None
 # --- END NEW JIOMART CHECKER ---
 
-
-# ==================================
-# 🗺️ STORE CHECKER MAP (UPDATED)
-# ==================================
-
-# Map store type to the specific checker function (single product check)
-STORE_CHECKERS_MAP = {
-    "croma": check_croma_product,
-    "flipkart": check_flipkart_product,
-    "amazon": check_amazon_api,                
-    "reliance_digital": check_reliance_digital_product, 
-    "iqoo": check_iqoo_api,                      
-    "vivo": check_vivo_api, 
-    "oppo": check_oppo_product,
-    "jiomart": check_jiomart_product, # Added Jiomart
-}
-
-# ==================================
-# 🚀 CHECKER HELPERS
-# ==================================
-
-# Helper wrapper for concurrent execution of DB-tracked products
-def check_store_products(store_type, products_to_check, pincodes):
+# --- Vijay Sales Checker (Batched vanNos + Pincode) ---
+def check_vijay_sales_batch(products, pincode):
     """
-    Checks all products of a specific store type, running inner checks sequentially.
-    If stock is found, it sends a Telegram message for this store type.
-    Returns a dict with total and found count.
+    Checks many Vijay Sales products at one pincode, sending up to
+    VIJAY_SALES_BATCH_SIZE vanNos per request. Returns one message-or-None per product, in order.
     """
-    checker_func = STORE_CHECKERS_MAP.get(store_type)
-    if not checker_func:
-        return {"total": 0, "found": 0}
-
-    messages_found = []
-    
-    # Stores where we check against all pincodes
-    if store_type in ["croma", "flipkart", "reliance_digital", "oppo", "jiomart"]:
-        for product in products_to_check:
-            for pincode in pincodes:
-                message = checker_func(product, pincode)
-                if message:
-                    messages_found.append(message)
-                    break # Stop checking other pincodes once stock is found
-    else:
-        # Stores with no pincode (Amazon, iQOO, Vivo, etc.)
-        for product in products_to_check:
-            message = checker_func(product)
-            if message:
-                messages_found.append(message)
+    results = [None] * len(products)
+    indexed = list(enumerate(products))
 
-    found_count = len(messages_found)
-    
-    # *** Send message if any stock was found for this store type ***
-    if found_count > 0:
-        header = f"🔥 *Stock Alert: {store_type.replace('_', ' ').title()}* {STORE_EMOJIS.get(store_type, '📦')}\n\n"
-        full_message = header + "\n---\n".join(messages_found)
-        
-        # --- MODIFIED: Get the thread_id for this store ---
-        thread_id = STORE_TOPIC_IDS.get(store_type)
-        send_telegram_message(full_message, chat_id=TELEGRAM_GROUP_ID, thread_id=thread_id)
-        # --- END MODIFIED ---
-        
-        print(f"[STORE_SENDER] ✅ Sent alert for {store_type.title()} with {found_count} products.")
-    else:
-        print(f"[STORE_SENDER] ❌ No stock found for {store_type.title()}. Skipping alert.")
+    for batch in chunked(indexed, VIJAY_SALES_BATCH_SIZE):
+        van_nos = list(dict.fromkeys(str(product["productId"]) for _, product in batch))
+        params = {"pincode": pincode, "vanNo": ",".join(van_nos), "storeList": "true"}
+        try:
+            res = http_request("vijay_sales", "GET", VIJAY_SALES_SERVICEABILITY_URL, params=params)
+            details = res.json().get("data") or {}
+        except Exception as e:
+            print(f"[error] Vijay Sales check failed for {', '.join(van_nos)}: {e}")
+            for index, _ in batch:
+                note_item_failure(index, type(e).__name__)
+            continue
+
+        for index, product in batch:
+            detail = details.get(str(product["productId"]))
+            if detail is None:
+                # No answer for this vanNo is not the same as "not serviceable"
+                note_item_failure(index)
+                print(f"[VS] ⚠️ No answer for {product['name']} at {pincode}")
+                continue
+            results[index] = vijay_sales_message(product, pincode, detail)
+
+    return results
+
+def vijay_sales_message(product, pincode, detail):
+    """Turns one vanNo's serviceability entry into an alert message, or None."""
+    delivery = detail.get("isServiceable", False)
+    pickup = len(detail.get("storePickupList") or []) > 0
+
+    if delivery or pickup:
+        print(f"[VS] ✅ {product['name']} available at {pincode}")
+        return (
+            f"[{product['name']}]({product['affiliateLink'] or product['url']})\n"
+            f"📦 Delivery: {'YES' if delivery else 'NO'}, "
+            f"🏬 Pickup: {'YES' if pickup else 'NO'}\n"
+            f"📍 Pincode: {pincode}"
+        )
 
-    # Return counts for the final summary
-    return {"total": len(products_to_check), "found": found_count}
+    print(f"[VS] ❌ {product['name']} not at {pincode}")
+    return None
 
-def check_unicorn_store():
-    """Checks all unicorn products, sends a message if stock is found."""
-    COLOR_VARIANTS = {
-        "Lavender": "313", "Sage": "311", "Mist Blue": "312", 
-        "White": "314", "Black": "315",
+# --- Sangeetha Checker (API + Pincode) ---
+def check_sangeetha_product(product, pincode):
+    """Checks a Sangeetha Mobiles product's delivery ETA at one pincode."""
+    payload = {
+        "type": "pwa",
+        "product_id": str(product["productId"]),
+        "pinCode": str(pincode),
+        "user_id": "70638581",
+        "user_location": "AutoCheck",
     }
-    STORAGE_256GB_ID = "250"
-    
-    messages_found = []
 
-    for color_name, color_id in COLOR_VARIANTS.items():
-        message = check_unicorn_product(color_name, color_id, STORAGE_256GB_ID)
-        if message:
-            messages_found.append(message)
-            
-    found_count = len(messages_found)
-    
-    if found_count > 0:
-        header = f"🔥 *Stock Alert: Unicorn* {STORE_EMOJIS.get('unicorn', '📦')}\n\n"
-        full_message = header + "\n---\n".join(messages_found)
-        
-        # --- MODIFIED: Get the thread_id for this store ---
-        thread_id = STORE_TOPIC_IDS.get('unicorn')
-        send_telegram_message(full_message, chat_id=TELEGRAM_GROUP_ID, thread_id=thread_id)
-        # --- END MODIFIED ---
-        
-        print(f"[STORE_SENDER] ✅ Sent alert for Unicorn with {found_count} products.")
-    else:
-        print(f"[STORE_SENDER] ❌ No stock found for Unicorn. Skipping alert.")
-
-    return {"total": len(COLOR_VARIANTS), "found": found_count}
+    try:
+        res = http_request(
+            "sangeetha", "POST", SANGEETHA_ETA_URL, json=payload, expected_statuses=SANGEETHA_OOS_STATUSES
+        )
 
-# ==================================
-# 🛍️ VIJAY SALES STATIC CHECKER (NEW)
-# ==================================
-def check_vijay_sales_store():
-    """Checks stock for the 5 fixed iPhone 17 variants on Vijay Sales."""
-    # Use the globally loaded pincodes
-    PINCODES = PINCODES_TO_CHECK  
-    
-    # Hardcoded products (like Unicorn function)
-    PRODUCTS = {
-        "iPhone 17 Mist Blue 256GB": {
-            "vanNo": "245181",
-            "url": "https://www.vijaysales.com/p/P245179/245181/apple-iphone-17-256gb-storage-mist-blue"
-        },
-        "iPhone 17 Black 256GB": {
-            "vanNo": "245179",
-            "url": "https://www.vijaysales.com/p/P245179/245179/apple-iphone-17-256gb-storage-black"
-        },
-        "iPhone 17 White 256GB": {
-            "vanNo": "245180",
-            "url": "https://www.vijaysales.com/p/P245179/245180/apple-iphone-17-256gb-storage-white"
-        },
-        "iPhone 17 Lavender 256GB": {
-            "vanNo": "245182",
-            "url": "https://www.vijaysales.com/p/P245179/245182/apple-iphone-17-256gb-storage-lavender"
-        },
-        "iPhone 17 Sage 256GB": {
-            "vanNo": "245183",
-            "url": "https://www.vijaysales.com/p/P245179/245183/apple-iphone-17-256gb-storage-sage"
-        }
-    }
+        # OOS means product removed → 500 or 404
+        if res.status_code in SANGEETHA_OOS_STATUSES:
+            print(f"[SANGEETHA] ❌ {product['name']} removed/OOS")
+            return None
 
-    messages_found = []
-    total_variants = len(PRODUCTS)
+        if res.status_code != 200:
+            print(f"[SANGEETHA] ❌ Unexpected status {res.status_code}")
+            note_request_failure(f"HTTP{res.status_code}")
+            return None
 
-    for name, info in PRODUCTS.items():
-        vanNo = info["vanNo"]
-        url = info["url"]
+        eta = res.json().get("data", {}).get("product_eta")
 
-        for pin in PINCODES:
-            api_url = (
-                f"https://mdm.vijaysales.com/web/api/oms/check-servicibility/v1"
-                f"?pincode={pin}&vanNo={vanNo}&storeList=true"
+        if eta and eta.get("stock_status", "").lower() == "instock":
+            print(f"[SANGEETHA] ✅ {product['name']} IN STOCK at {pincode}")
+            return (
+                f"[{product['name']}]({product['affiliateLink'] or product['url']})\n"
+                f"📍 Pincode: {pincode}\n"
+                f"ETA: {eta.get('eta_title', '')}"
             )
 
-            headers = {
-                "accept": "*/*",
-                "origin": "https://www.vijaysales.com",
-                "referer": "https://www.vijaysales.com/",
-                "user-agent": (
-                    "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142 Mobile Safari/537.36"
-                )
-            }
+        print(f"[SANGEETHA] ❌ {product['name']} OOS at {pincode}")
 
-            try:
-                res = requests.get(api_url, headers=headers, timeout=10)
-                data = res.json()
-
-                detail = data.get("data", {}).get(str(vanNo), {})
-                delivery = detail.get("isServiceable", False)
-                pickup_list = detail.get("storePickupList", [])
-                pickup = len(pickup_list) > 0
-
-                if delivery or pickup:
-                    print(f"[VS] ✅ {name} available at {pin}")
-                    msg = (
-                        f"[{name}]({url})\n"
-                        f"📦 Delivery: {'YES' if delivery else 'NO'}, "
-                        f"🏬 Pickup: {'YES' if pickup else 'NO'}\n"
-                        f"📍 Pincode: {pin}"
-                    )
-                    messages_found.append(msg)
-                    break  # no need to check other pincodes
-
-                else:
-                    print(f"[VS] ❌ {name} not at {pin}")
+    except Exception as e:
+        print(f"[error] Sangeetha check failed for {product['name']}: {e}")
+        note_request_failure(type(e).__name__)
+    return None
 
-            except Exception as e:
-                print(f"[error] Vijay Sales failed for {name}: {e}")
-    
-    # --- Add the Telegram sending logic ---
-    found_count = len(messages_found)
-    
-    if found_count > 0:
-        header = f"🔥 *Stock Alert: Vijay Sales* {STORE_EMOJIS.get('vijay_sales', '🛍️')}\n\n"
-        full_message = header + "\n---\n".join(messages_found)
-        
-        # --- MODIFIED: Get the thread_id for this store ---
-        thread_id = STORE_TOPIC_IDS.get('vijay_sales')
-        send_telegram_message(full_message, chat_id=TELEGRAM_GROUP_ID, thread_id=thread_id)
-        # --- END MODIFIED ---
-        
-        print(f"[STORE_SENDER] ✅ Sent alert for Vijay Sales with {found_count} products.")
-    else:
-        print(f"[STORE_SENDER] ❌ No stock found for Vijay Sales. Skipping alert.")
 
-    # --- Return the standard count dictionary ---
-    return {"total": total_variants, "found": found_count}
+# ==================================
+# 🗺️ STORE REGISTRY
+# ==================================
 
+class StoreSpec:
+    """
+    What the engine and the HTTP layer know about one store.
+
+    checker(product[, pincode]) returns a message or None. Stores whose
+    upstream takes many products per request declare batch_checker(products[, pincode])
+    instead (one message-or-None per product, at most batch_size products);
+    their single-product checker is derived from it.
+    pincodes: checked at every pincode in PINCODES_TO_CHECK.
+    rate_limit: (requests per second, burst) for the store's token bucket.
+    concurrency: max checker calls in flight for the store.
+    timeout: request timeout until the host's latency has been observed.
+    idempotent: duplicate requests are harmless, so slow ones may be hedged.
+    expected_cost: seconds per checker call until real ones are observed.
+    """
 
+    def __init__(self, checker=None, batch_checker=None, batch_size=1, pincodes=False,
+                 rate_limit=DEFAULT_RATE_LIMIT, concurrency=PER_STORE_CONCURRENCY,
+                 timeout=DEFAULT_REQUEST_TIMEOUT, idempotent=False, expected_cost=DEFAULT_CHECK_COST):
+        if checker is None and batch_checker is None:
+            raise ValueError("A store needs a checker or a batch_checker")
+        self.checker = checker or functools.partial(check_single_from_batch, batch_checker)
+        self.batch_checker = batch_checker
+        self.batch_size = batch_size if batch_checker else 1
+        self.pincodes = pincodes
+        self.rate_limit = rate_limit
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.idempotent = idempotent
+        self.expected_cost = expected_cost
+
+    def calls_for(self, product_count, pincode_count):
+        """Upper bound on checker calls for a run: every batch at every pincode."""
+        batches = -(-product_count // self.batch_size)
+        return batches * (pincode_count if self.pincodes else 1)
+
+def check_single_from_batch(batch_checker, product, *args):
+    return batch_checker([product], *args)[0]
+
+STORE_SPECS = {
+    "croma": StoreSpec(
+        check_croma_product, pincodes=True,
+        rate_limit=_store_rate_limit("CROMA", 5, 5),
+    ),
+    "flipkart": StoreSpec(
+        batch_checker=check_flipkart_batch, batch_size=FLIPKART_BATCH_SIZE, pincodes=True,
+        rate_limit=_store_rate_limit("FLIPKART", 10, 10),
+        concurrency=int(os.getenv("FLIPKART_CONCURRENCY", PER_STORE_CONCURRENCY)),
+        # Both proxies are our own workers, so a duplicate request costs the store nothing
+        timeout=25, idempotent=True, expected_cost=6.0,
+    ),
+    "amazon": StoreSpec(
+        batch_checker=check_amazon_batch, batch_size=AMAZON_BATCH_SIZE,
+        rate_limit=_store_rate_limit("AMAZON", 1, 1),  # PAAPI default is 1 TPS
+        # PAAPI throttles per second, so batches go out one at a time by default
+        concurrency=int(os.getenv("AMAZON_CONCURRENCY", "1")),
+    ),
+    "reliance_digital": StoreSpec(
+        check_reliance_digital_product, pincodes=True,
+        rate_limit=_store_rate_limit("RELIANCE", 10, 10),
+        concurrency=int(os.getenv("RELIANCE_CONCURRENCY", PER_STORE_CONCURRENCY)),
+        timeout=25, idempotent=True, expected_cost=6.0,
+    ),
+    "iqoo": StoreSpec(
+        functools.partial(check_vivo_iqoo_api, store_type="iqoo"),
+        rate_limit=_store_rate_limit("IQOO", 5, 5),
+    ),
+    "vivo": StoreSpec(
+        functools.partial(check_vivo_iqoo_api, store_type="vivo"),
+        rate_limit=_store_rate_limit("VIVO", 5, 5),
+    ),
+    "oppo": StoreSpec(
+        batch_checker=check_oppo_batch, batch_size=OPPO_BATCH_SIZE, pincodes=True,
+        rate_limit=_store_rate_limit("OPPO", 5, 5), timeout=15,
+    ),
+    "jiomart": StoreSpec(
+        check_jiomart_product, pincodes=True,
+        rate_limit=_store_rate_limit("JIOMART", 5, 5), timeout=15,
+    ),
+    "unicorn": StoreSpec(
+        check_unicorn_product,
+        rate_limit=_store_rate_limit("UNICORN", 5, 5),
+    ),
+    "vijay_sales": StoreSpec(
+        batch_checker=check_vijay_sales_batch, batch_size=VIJAY_SALES_BATCH_SIZE, pincodes=True,
+        rate_limit=_store_rate_limit("VIJAY_SALES", 5, 5),
+    ),
+    "sangeetha": StoreSpec(
+        check_sangeetha_product, pincodes=True,
+        rate_limit=_store_rate_limit("SANGEETHA", 5, 5), timeout=15,
+    ),
+}
 
-def check_sangeetha_store():
-    """Checks hardcoded iPhone 17 variants for Sangeetha Mobiles."""
-    
-    PRODUCTS = {
-        19685: "iPhone 17 Sage",
-        19681: "iPhone 17 Lavender",
-        19678: "iPhone 17 White",
-        19680: "iPhone 17 Black",
-        19683: "iPhone 17 Blue",
-    }
+# Lookup tables derived from STORE_SPECS; bench/ tweaks the rate limits in place
+STORE_CHECKERS_MAP = {store: spec.checker for store, spec in STORE_SPECS.items()}
+PINCODE_STORES = [store for store, spec in STORE_SPECS.items() if spec.pincodes]
+STORE_BATCH_CHECKERS_MAP = {store: spec.batch_checker for store, spec in STORE_SPECS.items() if spec.batch_checker}
+STORE_BATCH_SIZES = {store: spec.batch_size for store, spec in STORE_SPECS.items() if spec.batch_checker}
+STORE_RATE_LIMITS = {store: spec.rate_limit for store, spec in STORE_SPECS.items()}
+STORE_CONCURRENCY = {store: spec.concurrency for store, spec in STORE_SPECS.items()}
+STORE_EXPECTED_COST = {store: spec.expected_cost for store, spec in STORE_SPECS.items()}
+if HEDGED_STORES_OVERRIDE is None:
+    HEDGED_STORES = {store for store, spec in STORE_SPECS.items() if spec.idempotent}
+else:
+    HEDGED_STORES = {s.strip() for s in HEDGED_STORES_OVERRIDE.split(",") if s.strip() in STORE_SPECS}
+
+def store_timeout(store_type):
+    spec = STORE_SPECS.get(store_type)
+    return spec.timeout if spec else DEFAULT_REQUEST_TIMEOUT
+
+def plan_run(products_by_store, pincodes):
+    """
+    Estimates each store's share of a run from its spec: checker calls (before
+    pincode classes and early stops) and the seconds they need at the store's
+    concurrency and rate limit. Returns {store_type: {products, calls, seconds}}.
+    """
+    plan = {}
+    for store_type, products in products_by_store.items():
+        spec = STORE_SPECS.get(store_type)
+        if spec is None or not products:
+            continue
+        calls = spec.calls_for(len(products), len(pincodes))
+        rate, burst = STORE_RATE_LIMITS.get(store_type, spec.rate_limit)
+        by_concurrency = calls * expected_check_cost(store_type) / max(1, spec.concurrency)
+        by_rate = max(0, calls - burst) / rate if rate > 0 else 0
+        plan[store_type] = {
+            "products": len(products),
+            "calls": calls,
+            "seconds": round(max(by_concurrency, by_rate), 1),
+        }
+    return plan
 
-    PINCODES = PINCODES_TO_CHECK
-    API_URL = "https://www.sangeethamobiles.com/b/customer/api/v3/product-eta-details"
-
-    HEADERS = {
-        "accept": "application/json, text/plain, */*",
-        "content-type": "application/json",
-        "origin": "https://www.sangeethamobiles.com",
-        "referer": "https://www.sangeethamobiles.com/",
-        "user-agent": (
-            "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Mobile Safari/537.36"
-        ),
-        "number1": "1",
-        "number2": "1",
-    }
+# ==================================
+# ⚡ ASYNC CHECK ENGINE
+# ==================================
+class CheckSkipped(Exception):
+    """Raised instead of dispatching a check the remaining run budget can't cover."""
 
-    messages_found = []
-    total_variants = len(PRODUCTS)
+class PriorityGate:
+    """
+    asyncio semaphore that hands free slots to the waiter with the lowest
+    priority key first (FIFO among equal keys).
+    """
 
-    for product_id, product_name in PRODUCTS.items():
-        for pincode in PINCODES:
-            payload = {
-                "type": "pwa",
-                "product_id": str(product_id),
-                "pinCode": str(pincode),
-                "user_id": "70638581",
-                "user_location": "AutoCheck",
-            }
+    def __init__(self, slots):
+        self.free = max(1, slots)
+        self.waiters = []
+        self.counter = itertools.count()
 
-            try:
-                res = requests.post(API_URL, json=payload, headers=HEADERS, timeout=15)
+    async def acquire(self, priority):
+        if self.free > 0 and not self.waiters:
+            self.free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # A slot was handed to us just as we were cancelled
+            raise
+
+    def release(self):
+        while self.waiters:
+            _, _, waiter = heapq.heappop(self.waiters)
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.free += 1
+
+# Observed seconds per checker call, kept across warm invocations
+_observed_cost = {}
+
+def expected_check_cost(store_type):
+    return _observed_cost.get(store_type, STORE_EXPECTED_COST.get(store_type, DEFAULT_CHECK_COST))
+
+def record_check_cost(store_type, seconds):
+    """Folds one observed call duration into the store's moving average."""
+    previous = _observed_cost.get(store_type)
+    _observed_cost[store_type] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+class CheckEngine:
+    """
+    Runs blocking checker calls as asyncio tasks on a shared thread pool.
+    Every call goes through a per-store semaphore and a global priority gate.
+    With a deadline, calls the remaining budget can't cover are skipped.
+    """
 
-                # OOS means product removed → 500 or 404
-                if res.status_code in [500, 404]:
-                    print(f"[SANGEETHA] ❌ {product_name} removed/OOS")
-                    continue
+    def __init__(self, max_concurrency=MAX_CONCURRENT_CHECKS, store_concurrency=None,
+                 race_mode=PINCODE_RACE_MODE, race_width=PINCODE_RACE_WIDTH, deadline=None,
+                 previous_state=None, pincode_classes=None, plan=None):
+        self.max_concurrency = max_concurrency
+        self.store_concurrency = store_concurrency or STORE_CONCURRENCY
+        self.race_mode = race_mode
+        self.race_width = race_width
+        self.deadline = deadline
+        self.executor = None
+        self.global_gate = None
+        self.store_semaphores = {}
+        self.skipped = []
+        self.skipped_products = set()
+        self.observations = {}
+        # {product_id: {pincode: (in_stock, price)}} from stock_state, or None to alert on every hit
+        self.previous_state = previous_state
+        self.state_rows = []
+        # (send_alert futures, message parts, held rows) per queued alert, see delivered_state_rows
+        self.pending_alerts = []
+        # id(product) -> True/False (stock or price changed), None when unknown
+        self.changes = {}
+        # PincodeClasses, or None to query every pincode
+        self.pincode_classes = pincode_classes
+        # plan_run output; stores planned past the deadline queue behind the others
+        self.plan = plan or {}
+        self.over_budget = set()
+
+    def store_semaphore(self, store_type):
+        if store_type not in self.store_semaphores:
+            limit = self.store_concurrency.get(store_type, PER_STORE_CONCURRENCY)
+            self.store_semaphores[store_type] = asyncio.Semaphore(max(1, limit))
+        return self.store_semaphores[store_type]
+
+    def priority(self, store_type, products):
+        """
+        Lower runs first: stores whose planned time fits the budget before those
+        that don't, then products checked longest ago (never, or skipped last
+        run), then cheaper stores.
+        """
+        last_checked = min(
+            (p["lastCheckedAt"].timestamp() if p.get("lastCheckedAt") else 0.0) for p in products
+        )
+        return (store_type in self.over_budget, last_checked, expected_check_cost(store_type))
+
+    def skip(self, store_type, product):
+        self.skipped_products.add(id(product))
+        self.skipped.append({"store": store_type, "name": product["name"], "productId": product["productId"]})
+
+    def observe(self, product, pincode, message, failed):
+        """Records one checked (product, pincode) outcome for stock state tracking."""
+        self.observations.setdefault(id(product), []).append((pincode, message, failed))
+
+    def observations_for(self, product):
+        return self.observations.get(id(product), [])
+
+    def pincode_plan(self, store_type, pincodes):
+        """Returns (pincodes to query, {representative: [members]}, verify), see PincodeClasses.plan."""
+        if self.pincode_classes is None:
+            return list(pincodes), {}, False
+        return self.pincode_classes.plan(store_type, pincodes)
+
+    def cached_result(self, store_type, product, pincode, members=()):
+        """
+        A recent (message, failed) for this product's pincode class, or None.
+        Only pincodes standing in for merged members use the cache; a pincode
+        checked on its own always gets a fresh answer.
+        """
+        if not members or self.pincode_classes is None or not self.pincode_classes.applies(store_type):
+            return None
+        cached = get_cached_pincode_result(store_type, product["productId"], pincode)
+        if cached is not None:
+            metrics.inc("pincode_cache_hits_total", store=store_type)
+        return cached
+
+    def observe_pincode(self, store_type, product, pincode, message, failed, members=(), fetched=True):
+        """
+        Records a pincode outcome, plus the same outcome for the members of its
+        class that weren't queried. Fetched answers also feed the class history and cache.
+        """
+        self.observe(product, pincode, message, failed)
+        if failed or self.pincode_classes is None or not self.pincode_classes.applies(store_type):
+            return
+        if fetched:
+            self.pincode_classes.record(store_type, product, pincode, bool(message))
+            if members:
+                cache_pincode_result(store_type, product["productId"], pincode, message)
+        for member in members:
+            self.observe(product, member, message, False)
+        if members:
+            metrics.inc("pincode_checks_inferred_total", len(members), store=store_type)
+
+    def time_remaining(self):
+        return float("inf") if self.deadline is None else self.deadline - time.time()
+
+    async def run_check(self, store_type, checker_func, *args, priority=(0.0, 0.0)):
+        """
+        Runs one checker call once both concurrency slots are free.
+        If the caller is cancelled, the slots stay held until the worker thread
+        actually finishes, so cancelled races never exceed the caps.
+        Raises CheckSkipped if the call can't finish before the deadline.
+        Returns (result, failed), see call_with_outcome; metrics are recorded by instrumented_call.
+        """
+        store_semaphore = self.store_semaphore(store_type)
+        await store_semaphore.acquire()
+        try:
+            await self.global_gate.acquire(priority)
+        except BaseException:
+            store_semaphore.release()
+            raise
+
+        if self.time_remaining() < expected_check_cost(store_type):
+            self.global_gate.release()
+            store_semaphore.release()
+            metrics.inc("check_skipped_total", store=store_type, reason="budget")
+            raise CheckSkipped(store_type)
+
+        started = time.time()
+
+        def release(done_future):
+            store_semaphore.release()
+            self.global_gate.release()
+            if not done_future.cancelled():
+                record_check_cost(store_type, time.time() - started)
+                done_future.exception()  # Mark as retrieved when nobody awaits it anymore
+
+        pincode = args[1] if store_type in PINCODE_STORES else ""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, instrumented_call, store_type, pincode, checker_func, *args)
+        future.add_done_callback(release)
+        try:
+            # Calls still running at the deadline are abandoned, not awaited
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, self.time_remaining()))
+        except asyncio.TimeoutError:
+            metrics.inc("check_skipped_total", store=store_type, reason="deadline")
+            raise CheckSkipped(store_type)
+
+    def race_limit(self, pincodes):
+        return self.race_width if self.race_width > 0 else max(1, len(pincodes))
+
+    async def race_product(self, store_type, checker_func, product, pincodes, members, priority):
+        """Checks pincodes of one product concurrently; the first positive wins, the rest are cancelled."""
+        queue = list(pincodes)
+        pending = {}
+        incomplete = False
+        try:
+            while queue or pending:
+                while queue and len(pending) < self.race_limit(pincodes):
+                    pincode = queue.pop(0)
+                    task = asyncio.create_task(
+                        self.run_check(store_type, checker_func, product, pincode, priority=priority)
+                    )
+                    pending[task] = pincode
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pincode = pending.pop(task)
+                    try:
+                        message, failed = task.result()
+                    except CheckSkipped:
+                        incomplete = True
+                        continue
+                    self.observe_pincode(store_type, product, pincode, message, failed, members.get(pincode, ()))
+                    if message:
+                        return message
+            if incomplete:
+                raise CheckSkipped(store_type)
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def race_batch(self, store_type, batch_func, products, pincodes, members, priority):
+        """Checks a batch at all pincodes concurrently; each product keeps its first positive result."""
+        results = [None] * len(products)
+        queue = list(pincodes)
+        pending = {}
+        incomplete = False
+        try:
+            while (queue or pending) and not all(results):
+                while queue and len(pending) < self.race_limit(pincodes):
+                    pincode = queue.pop(0)
+                    task = asyncio.create_task(
+                        self.run_check(store_type, batch_func, products, pincode, priority=priority)
+                    )
+                    pending[task] = pincode
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pincode = pending.pop(task)
+                    try:
+                        messages, failed = task.result()
+                    except CheckSkipped:
+                        incomplete = True
+                        continue
+                    for index, message in enumerate(messages):
+                        if not results[index]:
+                            self.observe_pincode(
+                                store_type, products[index], pincode, message, item_failed(failed, index),
+                                members.get(pincode, ()),
+                            )
+                        if message and not results[index]:
+                            results[index] = message
+            if incomplete:
+                for product, message in zip(products, results):
+                    if not message:
+                        self.skip(store_type, product)
+            return results
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def check_product(self, store_type, checker_func, product, pincodes):
+        """Checks one product, walking pincodes (one per class) in order until one is deliverable."""
+        priority = self.priority(store_type, [product])
+        found = None
+        try:
+            if store_type not in PINCODE_STORES:
+                message, failed = await self.run_check(store_type, checker_func, product, priority=priority)
+                self.observe(product, "", message, failed)
+                return message
+            query, members, verify = self.pincode_plan(store_type, pincodes)
+            if self.race_mode and not verify:
+                return await self.race_product(store_type, checker_func, product, query, members, priority)
+
+            for pincode in query:
+                cached = None if verify else self.cached_result(store_type, product, pincode, members.get(pincode, ()))
+                if cached is None:
+                    message, failed = await self.run_check(store_type, checker_func, product, pincode, priority=priority)
+                else:
+                    message, failed = cached
+                self.observe_pincode(
+                    store_type, product, pincode, message, failed, members.get(pincode, ()), fetched=cached is None
+                )
+                if message and not found:
+                    found = message
+                    if not verify:
+                        break  # Stop checking other pincodes once stock is found
+            return found
+        except CheckSkipped:
+            if found:
+                return found
+            self.skip(store_type, product)
+            return None
 
-                if res.status_code != 200:
-                    print(f"[SANGEETHA] ❌ Unexpected status {res.status_code}")
+    async def check_batch(self, store_type, batch_func, products, pincodes):
+        """Checks a batch of products with one call per pincode, first pincode wins per product."""
+        priority = self.priority(store_type, products)
+        if store_type not in PINCODE_STORES:
+            try:
+                messages, failed = await self.run_check(store_type, batch_func, products, priority=priority)
+            except CheckSkipped:
+                for product in products:
+                    self.skip(store_type, product)
+                return [None] * len(products)
+            for index, (product, message) in enumerate(zip(products, messages)):
+                self.observe(product, "", message, item_failed(failed, index))
+            return messages
+        query, members, verify = self.pincode_plan(store_type, pincodes)
+        if self.race_mode and not verify:
+            return await self.race_batch(store_type, batch_func, products, query, members, priority)
+
+        results = [None] * len(products)
+        remaining = list(range(len(products)))
+        for pincode in query:
+            if not remaining:
+                break
+            to_fetch = []
+            for index in remaining:
+                cached = None if verify else self.cached_result(
+                    store_type, products[index], pincode, members.get(pincode, ())
+                )
+                if cached is None:
+                    to_fetch.append(index)
                     continue
-
-                data = res.json()
-                eta = data.get("data", {}).get("product_eta")
-
-                if eta and eta.get("stock_status", "").lower() == "instock":
-                    print(f"[SANGEETHA] ✅ {product_name} IN STOCK at {pincode}")
-                    url = f"https://www.sangeethamobiles.com/product-details/{product_id}"
-                    msg = (
-                        f"[{product_name}]({url})\n"
-                        f"📍 Pincode: {pincode}\n"
-                        f"ETA: {eta.get('eta_title', '')}"
+                message, failed = cached
+                self.observe_pincode(
+                    store_type, products[index], pincode, message, failed, members.get(pincode, ()), fetched=False
+                )
+                results[index] = results[index] or message
+            if to_fetch:
+                try:
+                    messages, failed = await self.run_check(
+                        store_type, batch_func, [products[i] for i in to_fetch], pincode, priority=priority
                     )
-                    messages_found.append(msg)
+                except CheckSkipped:
+                    for index in remaining:
+                        if not results[index]:
+                            self.skip(store_type, products[index])
                     break
+                for position, (index, message) in enumerate(zip(to_fetch, messages)):
+                    self.observe_pincode(
+                        store_type, products[index], pincode, message, item_failed(failed, position), members.get(pincode, ())
+                    )
+                    results[index] = results[index] or message
+            # Only products still unavailable move on to the next pincode (all of them when verifying)
+            if not verify:
+                remaining = [index for index in remaining if not results[index]]
+        return results
+
+    async def run_stores(self, products_by_store, pincodes):
+        """Checks every store concurrently. Returns {store_type: result or exception}."""
+        self.global_gate = PriorityGate(self.max_concurrency)
+        self.store_semaphores = {}
+        self.skipped = []
+        self.skipped_products = set()
+        self.observations = {}
+        self.state_rows = []
+        self.pending_alerts = []
+        self.changes = {}
+        reset_run_cache()
+        store_types = [s for s, products in products_by_store.items() if products]
+        # A store that can't finish anyway shouldn't starve the ones that can
+        self.over_budget = set()
+        if self.deadline is not None:
+            remaining = self.deadline - time.time()
+            self.over_budget = {
+                store for store in store_types if self.plan.get(store, {}).get("seconds", 0) > remaining
+            }
+            for store in sorted(self.over_budget):
+                print(f"[plan] {store} needs ~{self.plan[store]['seconds']}s of {remaining:.0f}s left, checking it last.")
 
-                else:
-                    print(f"[SANGEETHA] ❌ {product_name} OOS")
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.max_concurrency))
+        self.executor = executor
+        try:
+            results = await asyncio.gather(
+                *(
+                    check_store_products(store_type, products_by_store[store_type], pincodes, self)
+                    for store_type in store_types
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            # Don't wait for calls abandoned at the deadline
+            executor.shutdown(wait=self.deadline is None, cancel_futures=True)
+            self.executor = None
+        return dict(zip(store_types, results))
 
-            except Exception as e:
-                print(f"[error] Sangeetha failed for {product_name}: {e}")
+    def run(self, products_by_store, pincodes):
+        return asyncio.run(self.run_stores(products_by_store, pincodes))
 
-    # Send Telegram message
-    found_count = len(messages_found)
+# ==================================
+# 🚀 CHECKER HELPERS
+# ==================================
 
-    if found_count > 0:
-        header = f"🔥 *Stock Alert: Sangeetha Mobiles* {STORE_EMOJIS.get('sangeetha', '📱')}\n\n"
-        full_message = header + "\n---\n".join(messages_found)
-        thread_id = STORE_TOPIC_IDS.get("sangeetha")
-        send_telegram_message(full_message, chat_id=TELEGRAM_GROUP_ID, thread_id=thread_id)
-        print(f"[STORE_SENDER] ✅ Sent alert for Sangeetha with {found_count} products.")
+# Store-level wrapper run by the engine for DB-tracked products
+async def check_store_products(store_type, products_to_check, pincodes, engine):
+    """
+    Checks all products of a specific store type, one asyncio task per product
+    (or per batch, for stores whose spec has a batch_checker).
+    If any product changed stock status or price since the last run, it queues
+    one alert for this store type (see apply_stock_transitions and send_alert).
+    Returns a dict with total and found (currently in stock) count.
+    """
+    spec = STORE_SPECS.get(store_type)
+    if not spec:
+        return {"total": 0, "found": 0}
+
+    if spec.batch_checker:
+        batches = chunked(products_to_check, spec.batch_size)
+        batch_results = await asyncio.gather(
+            *(engine.check_batch(store_type, spec.batch_checker, batch, pincodes) for batch in batches)
+        )
+        results = [message for batch in batch_results for message in batch]
     else:
-        print(f"[STORE_SENDER] ❌ No stock found for Sangeetha.")
+        results = await asyncio.gather(
+            *(engine.check_product(store_type, spec.checker, product, pincodes) for product in products_to_check)
+        )
+    # gather keeps product order, so alerts read the same as the old sequential loop
+    messages_found = [message for message in results if message]
 
-    return {"total": total_variants, "found": found_count}
+    found_count = len(messages_found)
 
+    # Only stock/price transitions are alerted; unchanged products stay quiet
+    alerts, gone, held = apply_stock_transitions(engine, products_to_check, results)
 
+    if alerts or gone:
+        header = f"🔥 *Stock Alert: {store_type.replace('_', ' ').title()}* {STORE_EMOJIS.get(store_type, '📦')}\n\n"
+        alert_messages = pack_messages(header, [
+            ("", alerts, "\n---\n"),
+            ("❌ *Now out of stock:*\n", gone, "\n"),
+        ])
+        
+        # --- MODIFIED: Get the thread_id for this store ---
+        thread_id = STORE_TOPIC_IDS.get(store_type)
+        futures = send_alert(alert_messages, chat_id=TELEGRAM_GROUP_ID, thread_id=thread_id)
+        # --- END MODIFIED ---
+        engine.pending_alerts.append((futures, alert_messages, held))
+        
+        print(f"[STORE_SENDER] ✅ Queued alert for {store_type.title()} with {len(alerts)} restocks/price changes, {len(gone)} gone in {len(alert_messages)} message(s).")
+    elif found_count > 0:
+        print(f"[STORE_SENDER] 💤 {found_count} {store_type.title()} products still in stock, nothing changed. Skipping alert.")
+    else:
+        print(f"[STORE_SENDER] ❌ No stock found for {store_type.title()}. Skipping alert.")
+
+    # Return counts for the final summary
+    return {"total": len(products_to_check), "found": found_count}
 
 # ==================================
-# 🧠 MAIN LOGIC (Original - No Bucketing)
+# 🧠 MAIN LOGIC
 # ==================================
-def main_logic():
+def main_logic(time_budget=None, shard=None, shards=None, products=None):
+    """
+    Runs one full stock check. time_budget (seconds) overrides RUN_TIME_BUDGET;
+    checks that can't finish within it are skipped and go first next run.
+    With shard/shards, only that slice of the catalog is checked.
+    `products` replaces the DB load with ready product dicts (used by bench/).
+    Returns (found, total, summary text, extra response fields).
+    """
     start_time = time.time()
-    print("[info] Starting stock check...")
-    products = get_products_from_db()
+    print("[info] Starting stock check..." + (f" (shard {shard}/{shards})" if shards else ""))
+    time_budget = RUN_TIME_BUDGET if time_budget is None else time_budget
+    run_deadline = start_time + time_budget if time_budget > 0 else None
+    set_run_deadline(run_deadline)
+    set_rate_limit_scale(1 / shards if shards else 1.0)
+    metrics.reset()
+    begin_circuit_run()
+    if ADAPTIVE_TIMEOUTS:
+        try:
+            load_latency_stats()
+        except Exception as e:
+            print(f"[error] Failed to load endpoint_latency, using default timeouts: {e}")
+    if products is None:
+        products = get_products_from_db(shard=shard, shards=shards, store_types=STORE_SPECS.keys())
+    if HTTP_RECORD_FILE:
+        record_catalog(products, PINCODES_TO_CHECK)
     
     
-    # 1. Separate DB products by store type
-    products_by_store = {
-        store_type: [p for p in products if p["storeType"] == store_type]
-        for store_type in STORE_CHECKERS_MAP.keys()
-    }
+    # 1. Separate DB products by store type (single pass)
+    products_by_store = {store_type: [] for store_type in STORE_SPECS.keys()}
+    for product in products:
+        products_by_store[product["storeType"]].append(product)
     
     # Stores to check concurrently
-    # The dictionary keys must contain all store types, including static ones, for the summary.
-    all_store_types = list(STORE_CHECKERS_MAP.keys()) + ["unicorn", "vijay_sales" , "sangeetha"]
     tracked_stores = {
         store: {"total": len(products_by_store.get(store, [])), "found": 0}
-        for store in all_store_types
+        for store in STORE_SPECS.keys()
     }
-    
-    # Manually set total for static checkers - PAUSED/IGNORED
-    # Setting them to 0 prevents them from skewing the total_tracked count when paused.
-    tracked_stores["unicorn"]["total"] = 0 
-    tracked_stores["vijay_sales"]["total"] = 0
-    tracked_stores["sangeetha"]["total"] = 0
 
-    
     total_tracked = sum(data['total'] for data in tracked_stores.values())
 
 
-    # --- Concurrent Check using ThreadPoolExecutor ---
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_store = {}
-        
-        # Submit tasks for DB-tracked stores (Jiomart, Oppo, Flipkart, etc.)
-        for store_type in STORE_CHECKERS_MAP.keys():
-            if products_by_store.get(store_type):
-                future = executor.submit(
-                    check_store_products, 
-                    store_type, 
-                    products_by_store[store_type], 
-                    PINCODES_TO_CHECK
-                )
-                future_to_store[future] = store_type
+    # --- Concurrent Check using the asyncio engine ---
+    # Every (product, pincode) check is its own task, bounded by the global
+    # and per-store caps.
+    previous_state = None
+    if STOCK_STATE_ENABLED:
+        try:
+            previous_state = load_stock_state([p["id"] for p in products if p.get("id") is not None])
+        except Exception as e:
+            print(f"[error] Failed to load stock_state, alerting on every hit: {e}")
 
-        # Submit static store tasks (PAUSED)
-        # We explicitly skip the submission of the hardcoded checkers here
-        
-        # future_to_store[executor.submit(check_unicorn_store)] = "unicorn"
-        #future_to_store[executor.submit(check_vijay_sales_store)] = "vijay_sales"
-        # future_to_store[executor.submit(check_sangeetha_store)] = "sangeetha"
+    pincode_classes = None
+    if PINCODE_CLASSES_ENABLED:
+        prune_pincode_results()
+        agreement = {}
+        try:
+            agreement = load_pincode_agreement()
+        except Exception as e:
+            print(f"[error] Failed to load pincode_agreement, checking every pincode: {e}")
+        pincode_classes = PincodeClasses(agreement)
+
+    run_plan = plan_run(products_by_store, PINCODES_TO_CHECK)
+    for store_type, planned in run_plan.items():
+        print(f"[plan] {store_type}: {planned['products']} products, up to {planned['calls']} calls, ~{planned['seconds']}s")
+    engine = CheckEngine(
+        deadline=run_deadline - DEADLINE_RESERVE_SECONDS if run_deadline else None,
+        previous_state=previous_state,
+        pincode_classes=pincode_classes,
+        plan=run_plan,
+    )
+    store_results = engine.run(products_by_store, PINCODES_TO_CHECK)
+
+    # Collect results (counts only)
+    for store_type, result in store_results.items():
+        if isinstance(result, Exception):
+            print(f"[ERROR] Concurrent check for {store_type} failed: {result}")
+            continue
+        # Update found count, but keep total as set above
+        tracked_stores[store_type]["found"] = result.get("found", 0)
+
+    # Alerts were only queued by the checks; deliver them before responding
+    notification_dispatcher.flush(timeout=min(NOTIFY_FLUSH_TIMEOUT, run_time_remaining()))
+
+    # Changed products are only saved once their alert went out, so none is lost
+    state_rows = engine.state_rows + delivered_state_rows(engine.pending_alerts)
+    if state_rows:
+        try:
+            save_stock_state(state_rows)
+        except Exception as e:
+            print(f"[error] Failed to save stock_state: {e}")
+
+    if engine.skipped:
+        print(f"[warn] Time budget ran out, skipped {len(engine.skipped)} products.")
+    # Skipped products keep their old schedule, so they are due (and first) next run
+    schedule_rows = [
+        (
+            p["id"],
+            *next_poll_interval(
+                p, engine.changes.get(id(p)), any(message for _, message, _ in engine.observations_for(p))
+            ),
+        )
+        for p in products
+        if p.get("id") is not None and id(p) not in engine.skipped_products
+    ]
+    try:
+        save_check_schedule(schedule_rows)
+    except Exception as e:
+        print(f"[error] Failed to update check schedule: {e}")
 
-        
-        # Collect results (counts only)
-        for future in concurrent.futures.as_completed(future_to_store):
-            store_type = future_to_store[future]
-            try:
-                result = future.result()
-                # Update found count, but keep total as set above
-                tracked_stores[store_type]["found"] = result.get("found", 0)
-            except Exception as e:
-                print(f"[ERROR] Concurrent check for {store_type} failed: {e}")
+    pincode_report = pincode_classes.report(PINCODES_TO_CHECK) if pincode_classes else {}
+    if pincode_classes and pincode_classes.deltas:
+        try:
+            save_pincode_agreement(pincode_classes.deltas)
+        except Exception as e:
+            print(f"[error] Failed to save pincode_agreement: {e}")
+
+    circuits = get_circuit_report()
+    try:
+        save_circuit_states()
+    except Exception as e:
+        print(f"[error] Failed to save endpoint_health: {e}")
+    try:
+        save_latency_stats()
+    except Exception as e:
+        print(f"[error] Failed to save endpoint_latency: {e}")
+    if HTTP_RECORD_FILE:
+        close_record_log()
 
     # 3. Compile final results for handler JSON response
     total_found = sum(data['found'] for data in tracked_stores.values())
     duration = round(time.time() - start_time, 2)
     timestamp = datetime.datetime.now().strftime("%d %b %Y %I:%M %p")
     
+    session_stats = get_session_stats()
+    for host, stats in session_stats.items():
+        print(f"[HTTP] {host}: {stats['requests']} requests over {stats['connections']} connections ({stats['reused']} reused)")
+    total_requests = sum(stats["requests"] for stats in session_stats.values())
+    total_connections = sum(stats["connections"] for stats in session_stats.values())
+
     summary_lines = [
         f"Found: {total_found}/{total_tracked} products available.",
         f"Time taken: {duration}s",
+        f"HTTP: {total_requests} requests over {total_connections} connections",
         f"Checked at: {timestamp}",
     ]
+    if engine.skipped:
+        summary_lines.insert(1, f"Skipped: {len(engine.skipped)} products (time budget), first in line next run.")
+    circuit_line = circuit_summary_line(circuits)
+    if circuit_line:
+        summary_lines.insert(1, circuit_line)
+    pincode_line = pincode_class_summary_line(pincode_report, PINCODES_TO_CHECK)
+    if pincode_line:
+        summary_lines.insert(-1, pincode_line)
+    if shards:
+        summary_lines.insert(0, f"Shard {shard + 1}/{shards}")
     final_summary = "\n".join(summary_lines)
 
     
 
     print(f"[info] ✅ Finished check. Found {total_found} products in stock.")
     
-    return total_found, total_tracked, final_summary
+    metrics.observe("run_duration_seconds", duration)
+    extra = {"skipped": engine.skipped, "circuits": circuits, "plan": run_plan, "metrics": metrics.snapshot()}
+    if pincode_report:
+        extra["pincode_classes"] = pincode_report
+    if shards:
+        extra["shard"] = {"index": shard, "count": shards}
+    return total_found, total_tracked, final_summary, extra
+
+
+# ==================================
+# 🧩 SHARD COORDINATOR
+# ==================================
+def run_sharded(base_url, query_components, shards):
+    """
+    Fans one invocation out into `shards` concurrent invocations of this same
+    endpoint (?shard=i&shards=n) and merges their reports.
+    Returns the same (found, total, summary, extra) shape as main_logic.
+    """
+    start_time = time.time()
+    budget = query_components.get("budget", [None])[0]
+    timeout = float(budget) + 15 if budget else 300
+
+    def call_shard(index):
+        params = {key: values[0] for key, values in query_components.items()}
+        params.update({"shard": index, "shards": shards})
+        if "metrics" in params:
+            params["metrics"] = "1"  # Shards always answer JSON; the coordinator renders the format
+        res = get_session(base_url).get(base_url, params=params, timeout=timeout)
+        res.raise_for_status()
+        return res.json()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=shards) as executor:
+        futures = [executor.submit(call_shard, index) for index in range(shards)]
+        reports = []
+        for index, future in enumerate(futures):
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                print(f"[ERROR] Shard {index + 1}/{shards} failed: {e}")
+                reports.append({"status": "error", "error": str(e), "shard": {"index": index, "count": shards}})
+
+    return merge_shard_reports(reports, time.time() - start_time)
+
+def merge_shard_reports(reports, duration):
+    """Combines per-shard handler responses into one final report."""
+    ok_reports = [r for r in reports if r.get("status") == "ok"]
+    total_found = sum(r.get("found", 0) for r in ok_reports)
+    total_tracked = sum(r.get("total", 0) for r in ok_reports)
+    skipped = [item for r in ok_reports for item in r.get("skipped", [])]
+    failed = [r["shard"]["index"] for r in reports if r.get("status") != "ok"]
+    # A circuit any shard saw open is reported open
+    circuits = {}
+    for r in ok_reports:
+        for endpoint, c in r.get("circuits", {}).items():
+            if endpoint not in circuits or c["state"] != "closed":
+                circuits[endpoint] = c
+    timestamp = datetime.datetime.now().strftime("%d %b %Y %I:%M %p")
+
+    summary_lines = [
+        f"Found: {total_found}/{total_tracked} products available.",
+        f"Shards: {len(ok_reports)}/{len(reports)} ok"
+        + (f" (failed: {', '.join(str(i + 1) for i in failed)})" if failed else ""),
+        f"Time taken: {round(duration, 2)}s",
+        f"Checked at: {timestamp}",
+    ]
+    if skipped:
+        summary_lines.insert(1, f"Skipped: {len(skipped)} products (time budget), first in line next run.")
+    circuit_line = circuit_summary_line(circuits)
+    if circuit_line:
+        summary_lines.insert(1, circuit_line)
+
+    # Shard metrics are folded into one registry instead of repeated per shard
+    merged = Metrics()
+    for r in ok_reports:
+        if "metrics" in r:
+            merged.merge(r.pop("metrics"))
+    merged.observe("run_duration_seconds", duration)
+
+    extra = {"skipped": skipped, "circuits": circuits, "metrics": merged.snapshot(), "shards": reports}
+    return total_found, total_tracked, "\n".join(summary_lines), extra
 
 
 # ==================================
@@ -1061,15 +3494,51 @@ class handler(BaseHTTPRequestHandler):
             return
 
         try:
-            # Main logic runs checks and sends store-specific messages via worker threads
-            total_found, total_tracked, final_summary = main_logic()
+            # Optional ?budget=<seconds> caps the run (defaults to RUN_TIME_BUDGET)
+            budget = query_components.get("budget", [None])[0]
+            time_budget = float(budget) if budget else None
+
+            # Optional ?shard=i&shards=n checks one slice of the catalog.
+            # ?shards=n alone fans out to n shard invocations and merges them.
+            shard = query_components.get("shard", [None])[0]
+            shards = query_components.get("shards", [None])[0]
+            shard = int(shard) if shard is not None else None
+            shards = int(shards) if shards else None
+            if shards and shard is not None and not 0 <= shard < shards:
+                raise ValueError(f"shard must be between 0 and {shards - 1}")
+
+            # Optional ?metrics=1 adds per-store/pincode metrics to the JSON;
+            # ?metrics=prometheus answers with the Prometheus text format instead.
+            metrics_format = query_components.get("metrics", [None])[0]
+
+            if shards and shard is None:
+                proto = self.headers.get("x-forwarded-proto", "https")
+                base_url = f"{proto}://{self.headers.get('host')}{urlparse(self.path).path}"
+                total_found, total_tracked, final_summary, extra = run_sharded(base_url, query_components, shards)
+            else:
+                # Main logic runs checks and sends store-specific messages via worker threads
+                total_found, total_tracked, final_summary, extra = main_logic(
+                    time_budget=time_budget, shard=shard, shards=shards
+                )
+
+            snapshot = extra.pop("metrics", None)
+            if metrics_format == "prometheus":
+                registry = Metrics()
+                registry.merge(snapshot or {})
+                self.send_response(200)
+                self.send_header("Content-type", "text/plain; version=0.0.4")
+                self.end_headers()
+                self.wfile.write(registry.to_prometheus().encode())
+                return
+            if metrics_format:
+                extra["metrics"] = snapshot
 
             self.send_response(200)
             self.send_header("Content-type", "application/json")
             self.end_headers()
             self.wfile.write(
                 json.dumps(
-                    {"status": "ok", "found": total_found, "total": total_tracked, "summary": final_summary}
+                    {"status": "ok", "found": total_found, "total": total_tracked, "summary": final_summary, **extra}
                 ).encode()
             )
 
@@ -1080,3 +3549,175 @@ class handler(BaseHTTPRequestHandler):
             self.send_header("Content-type", "application/json")
             self.end_headers()
             self.wfile.write(json.dumps({"error": str(e)}).encode())
+
+
+# ==================================
+# 🛰️ DAEMON MODE
+# ==================================
+class DaemonStatus:
+    """What /healthz and /metrics report: tick outcomes and metrics summed over every tick."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.metrics = Metrics()
+        self.ticks = 0
+        self.consecutive_failures = 0
+        self.last_tick_at = None
+        self.last_success_at = None
+        self.last_result = None
+        self.last_error = None
+        self.stopping = False
+
+    def record_tick(self, started_at, found, total, extra):
+        with self.lock:
+            self.ticks += 1
+            self.consecutive_failures = 0
+            self.last_tick_at = self.last_success_at = time.time()
+            self.last_result = {
+                "found": found,
+                "total": total,
+                "duration": round(time.time() - started_at, 2),
+                "skipped": len(extra.get("skipped", [])),
+                "circuits": extra.get("circuits", {}),
+            }
+        self.metrics.merge(extra.get("metrics") or {})
+        self.metrics.inc("daemon_ticks_total", outcome="ok")
+
+    def record_failure(self, error):
+        with self.lock:
+            self.ticks += 1
+            self.consecutive_failures += 1
+            self.last_tick_at = time.time()
+            self.last_error = f"{type(error).__name__}: {error}"
+        self.metrics.inc("daemon_ticks_total", outcome="error")
+
+    def health(self):
+        """
+        (healthy, report). Healthy only once a tick has succeeded, the last
+        success is under DAEMON_STALE_SECONDS old and fewer than
+        DAEMON_MAX_CONSECUTIVE_FAILURES ticks have failed since.
+        """
+        with self.lock:
+            if self.stopping:
+                state = "stopping"
+            elif self.last_success_at is None:
+                state = "starting"
+            elif self.consecutive_failures >= DAEMON_MAX_CONSECUTIVE_FAILURES:
+                state = "failing"
+            elif time.time() - self.last_success_at >= DAEMON_STALE_SECONDS:
+                state = "stale"
+            else:
+                state = "ok"
+            healthy = state == "ok"
+            report = {
+                "status": state,
+                "uptime": round(time.time() - self.started_at, 1),
+                "ticks": self.ticks,
+                "consecutive_failures": self.consecutive_failures,
+                "last_tick_at": self.last_tick_at,
+                "last_success_at": self.last_success_at,
+                "last_result": self.last_result,
+                "last_error": self.last_error,
+            }
+        return healthy, report
+
+def make_status_handler(status):
+    class DaemonStatusHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def reply(self, code, content_type, body):
+            self.send_response(code)
+            self.send_header("Content-type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/healthz":
+                healthy, report = status.health()
+                self.reply(200 if healthy else 503, "application/json", json.dumps(report).encode())
+            elif path == "/metrics":
+                self.reply(200, "text/plain; version=0.0.4", status.metrics.to_prometheus().encode())
+            else:
+                self.reply(404, "application/json", json.dumps({"error": "Not found"}).encode())
+
+    return DaemonStatusHandler
+
+def next_tick_delay(tick_started, failures):
+    """Seconds to sleep before the next tick: until the next product is due, within the tick bounds."""
+    if failures:
+        # Back off while ticks keep failing (DB down, ...)
+        return min(DAEMON_MAX_SLEEP_SECONDS, DAEMON_MIN_TICK_SECONDS * 2 ** (failures - 1))
+    due_in = DAEMON_MAX_SLEEP_SECONDS
+    try:
+        next_due = seconds_until_next_due(STORE_SPECS.keys())
+        if next_due is not None:
+            due_in = min(due_in, next_due)
+    except Exception as e:
+        print(f"[error] Failed to read the next due product, sleeping {due_in}s: {e}")
+    return max(due_in, DAEMON_MIN_TICK_SECONDS - (time.time() - tick_started))
+
+def run_daemon(port=DAEMON_PORT, time_budget=DAEMON_RUN_BUDGET):
+    """
+    Runs main_logic ticks until SIGTERM/SIGINT. Sessions, the DB connection,
+    latency stats and caches stay warm between ticks. The first signal lets
+    the current tick finish and delivers its alerts; a second one exits at once.
+    """
+    status = DaemonStatus()
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"[info] Got signal {signum}, stopping after the current tick...")
+        with status.lock:
+            status.stopping = True
+        stop.set()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    server = None
+    if port:
+        server = ThreadingHTTPServer(("0.0.0.0", port), make_status_handler(status))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="daemon-status", daemon=True).start()
+        print(f"[info] Health and metrics on :{server.server_port} (/healthz, /metrics)")
+
+    print("[info] Daemon started.")
+    while not stop.is_set():
+        tick_started = time.time()
+        try:
+            found, total, _, extra = main_logic(time_budget=time_budget)
+            status.record_tick(tick_started, found, total, extra)
+        except Exception as e:
+            print(f"[error] Daemon tick failed: {e}")
+            status.record_failure(e)
+        if not stop.is_set():
+            stop.wait(next_tick_delay(tick_started, status.consecutive_failures))
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    notification_dispatcher.flush(timeout=NOTIFY_FLUSH_TIMEOUT)
+    close_db_connection()
+    print("[info] Daemon stopped.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stock checker. Without --daemon, runs one check and prints the summary.")
+    parser.add_argument("--daemon", action="store_true", help="Check continuously in this process")
+    parser.add_argument("--port", type=int, default=DAEMON_PORT, help="Health/metrics port in daemon mode (0 = off)")
+    parser.add_argument("--budget", type=float, help="Time budget per run in seconds (0 = none)")
+    args = parser.parse_args(argv)
+
+    if args.daemon:
+        run_daemon(port=args.port, time_budget=DAEMON_RUN_BUDGET if args.budget is None else args.budget)
+        return
+    _, _, summary, _ = main_logic(time_budget=args.budget)
+    print(summary)
+
+if __name__ == "__main__":
+    main()
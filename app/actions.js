@@ -153,6 +153,30 @@ async function getProductDetails(url, partNumber) {
       return { name: nm, productId: partNumber, storeType: 'apple', partNumber };
     }
 
+    /* Unicorn (option ids of the variant, e.g. "313,250") */
+    if (u.hostname.includes('unicornstore.in')) {
+      if (!partNumber) throw new Error('Unicorn requires the variant option ids');
+      const title = u.pathname.split('/').filter(Boolean).pop() || 'Unicorn Product';
+      const nm = `(Unicorn) ${title.replace(/-/g, ' ')}`;
+      return { name: nm, productId: partNumber.replace(/\s/g, ''), storeType: 'unicorn', partNumber };
+    }
+
+    /* Vijay Sales: /p/<group>/<vanNo>/<slug> */
+    if (u.hostname.includes('vijaysales.com')) {
+      const parts = u.pathname.split('/').filter(Boolean);
+      const vanNo = parts[2];
+      if (!/^\d+$/.test(vanNo || '')) throw new Error('Could not extract Vijay Sales vanNo');
+      const nm = `(Vijay Sales) ${(parts[3] || 'Vijay Sales Product').replace(/-/g, ' ')}`;
+      return { name: nm, productId: vanNo, storeType: 'vijay_sales', partNumber: null };
+    }
+
+    /* Sangeetha: /product-details/<id> */
+    if (u.hostname.includes('sangeethamobiles.com')) {
+      const match = u.pathname.match(/\/(\d+)\/?$/);
+      if (!match) throw new Error('Could not extract Sangeetha product ID');
+      return { name: `(Sangeetha) Product ${match[1]}`, productId: match[1], storeType: 'sangeetha', partNumber: null };
+    }
+
     /* Croma */
     if (u.hostname.includes('croma.com')) {
       const parts = u.pathname.split('/');
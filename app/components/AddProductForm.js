@@ -28,6 +28,10 @@ function getStoreDetails(url) {
   if (u.includes('iqoo.com')) return { storeType: 'iqoo', showPartNumber: false, extracted: null };
   if (u.includes('vivo.com')) return { storeType: 'vivo', showPartNumber: false, extracted: null };
   if (u.includes('oppo.com')) return { storeType: 'oppo', showPartNumber: false, extracted: null };
+  if (u.includes('vijaysales.com')) return { storeType: 'vijay_sales', showPartNumber: false, extracted: null };
+  if (u.includes('sangeethamobiles.com')) return { storeType: 'sangeetha', showPartNumber: false, extracted: null };
+  // Unicorn variants are identified by their option ids, e.g. "313,250"
+  if (u.includes('unicornstore.in')) return { storeType: 'unicorn', showPartNumber: true, extracted: null };
   
   return { storeType: 'unknown', showPartNumber: false, extracted: null };
 }
@@ -119,7 +123,7 @@ export function AddProductForm({ addProductAction }) {
           type="text"
           name="partNumber"
           value={productId}
-          placeholder="Product ID (e.g., ASIN/PID/Part# for Amazon/Flipkart/Apple)"
+          placeholder="Product ID (e.g., ASIN/PID/Part# for Amazon/Flipkart/Apple, option ids for Unicorn)"
           required
           onChange={e => setProductId(e.target.value)}
         />
@@ -0,0 +1,126 @@
+"""
+Replays a record log through main_logic, optionally under cProfile.
+
+Record a log against the real stores (or the stubs) first:
+
+    HTTP_RECORD_FILE=capture.jsonl.gz python -c "from api import check; check.main_logic()"
+
+then profile the checkers' parsing on those payloads, offline:
+
+    python bench/replay.py capture.jsonl.gz --latency max --profile
+
+The catalog, pincodes and upstream URLs come from the log's last catalog line. The DB,
+Telegram and WhatsApp are disabled during the replay. cProfile only sees
+the thread it runs on, so --profile calls the checkers one by one on the
+main thread instead of going through the concurrent engine.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def run_checkers_inline(check, products, pincodes):
+    """Calls every checker (batched where the store supports it) sequentially. Returns the hit count."""
+    check.set_run_deadline(None)
+    check.reset_run_cache()
+    found = 0
+    by_store = {}
+    for product in products:
+        by_store.setdefault(product["storeType"], []).append(product)
+    for store_type, store_products in by_store.items():
+        per_pincode = pincodes if store_type in check.PINCODE_STORES else [None]
+        batch_func = check.STORE_BATCH_CHECKERS_MAP.get(store_type)
+        for pincode in per_pincode:
+            extra_args = () if pincode is None else (pincode,)
+            if batch_func:
+                for batch in check.chunked(store_products, check.STORE_BATCH_SIZES[store_type]):
+                    found += sum(1 for message in batch_func(batch, *extra_args) if message)
+            else:
+                checker = check.STORE_CHECKERS_MAP[store_type]
+                found += sum(1 for product in store_products if checker(product, *extra_args))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="Record log written with HTTP_RECORD_FILE")
+    parser.add_argument("--latency", choices=["original", "max"], default="max", help="Replay with recorded latency or immediately")
+    parser.add_argument("--stores", help="Only replay these store types (comma-separated)")
+    parser.add_argument("--profile", action="store_true", help="Run under cProfile and print the hottest functions")
+    parser.add_argument("--top", type=int, default=25, help="Functions to list with --profile")
+    parser.add_argument("--verbose", action="store_true", help="Keep the checkers' log output")
+    args = parser.parse_args()
+
+    # Must be set before api.check reads its configuration
+    os.environ.update({
+        "HTTP_REPLAY_FILE": args.log,
+        "HTTP_REPLAY_LATENCY": args.latency,
+        "DATABASE_URL": "",
+        "CHECK_DB_DISABLED": "1",
+        "STOCK_STATE_ENABLED": "0",
+        # Verification picks checks at random; the replay must only ask for recorded requests
+        "PINCODE_CLASSES_ENABLED": "0",
+        "TELEGRAM_BOT_TOKEN": "",
+        "WHATSAPP_API_URL": "",
+        "AWS_ACCESS_KEY_ID": os.environ.get("AWS_ACCESS_KEY_ID", "replay"),
+        "AWS_SECRET_ACCESS_KEY": os.environ.get("AWS_SECRET_ACCESS_KEY", "replay"),
+        "AMAZON_PARTNER_TAG": os.environ.get("AMAZON_PARTNER_TAG", "replay-21"),
+    })
+    os.environ.pop("HTTP_RECORD_FILE", None)
+    # libpq would still connect through these with an empty DATABASE_URL
+    for key in [key for key in os.environ if key.startswith("PG")]:
+        del os.environ[key]
+    from api import check
+
+    catalog = None
+    for entry in check.read_log(args.log):
+        if entry.get("type") == "catalog":
+            catalog = entry
+    if catalog is None:
+        sys.exit("No catalog line in the log; record it through main_logic.")
+
+    products = catalog["products"]
+    if args.stores:
+        wanted = set(args.stores.split(","))
+        products = [p for p in products if p["storeType"] in wanted]
+    products = [p for p in products if p["storeType"] in check.STORE_CHECKERS_MAP]
+    check.PINCODES_TO_CHECK = catalog["pincodes"]
+    for name, value in catalog.get("endpoints", {}).items():
+        setattr(check, name, value)
+    if args.latency == "max":
+        # Recorded traffic already obeyed the rate limits
+        for store in list(check.STORE_RATE_LIMITS):
+            check.STORE_RATE_LIMITS[store] = (1e6, 1_000_000)
+        check.DEFAULT_RATE_LIMIT = (1e6, 1_000_000)
+
+    output = sys.stdout if args.verbose else open(os.devnull, "w")
+    started = time.time()
+    if args.profile:
+        profiler = cProfile.Profile()
+        with contextlib.redirect_stdout(output):
+            profiler.enable()
+            hits = run_checkers_inline(check, products, check.PINCODES_TO_CHECK)
+            profiler.disable()
+        summary = f"Hits: {hits} (product, pincode) checks in stock."
+    else:
+        with contextlib.redirect_stdout(output):
+            _, _, summary, _ = check.main_logic(products=products)
+    wall = time.time() - started
+
+    print(f"Replayed {len(products)} products over {len(check.PINCODES_TO_CHECK)} pincodes in {wall:.2f}s")
+    print(summary)
+    if args.profile:
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream).sort_stats("tottime")
+        stats.print_stats(args.top)
+        print(stream.getvalue())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Offline benchmark for api/check.py's main_logic.
+
+Starts stub servers for every upstream (see stubs.py), then runs one
+main_logic pass per catalog size in a fresh subprocess pointed at them,
+with a synthetic catalog instead of the DB. Reports wall time,
+requests/sec, peak memory and time-to-first-alert per size.
+
+    python bench/run.py --sizes 10,1000,10000
+    python bench/run.py --store-latency flipkart=lognormal:0.4:1.2 --error-rate 0.02
+    python bench/run.py --json results.json --compare baseline.json
+
+No network or database access is needed. Store rate limits are lifted by
+default so the numbers measure our side; --real-rate-limits keeps them.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import SKUS_PER_SPU, STUB_STORES, StoreProfile, StubCluster, vivo_sku_ids
+
+def synthetic_catalog(size, stores):
+    """`size` product dicts (the shape get_products_from_db returns) spread evenly over `stores`."""
+    products = []
+    per_store = {store: 0 for store in stores}
+    for index in range(size):
+        store = stores[index % len(stores)]
+        n = per_store[store]
+        per_store[store] += 1
+        product = {
+            "id": index + 1,
+            "name": f"Bench {store} {n}",
+            "url": f"https://example.com/{store}/{n}",
+            "productId": f"{store[:3].upper()}{n:06d}",
+            "storeType": store,
+            "affiliateLink": None,
+            "lastCheckedAt": None,
+            "pollInterval": 0,
+            "volatility": 0.0,
+        }
+        if store == "unicorn":
+            product["productId"] = f"{300 + n},250"  # color option id, storage option id
+        if store in ("vivo", "iqoo"):
+            # Several tracked SKUs per SPU, like real variants
+            spu = str(100000 + n // SKUS_PER_SPU)
+            sku = vivo_sku_ids(spu)[n % SKUS_PER_SPU]
+            product["productId"] = spu
+            product["url"] = f"https://mshop.{store}.com/in/product/{spu}?skuId={sku}"
+        products.append(product)
+    return products
+
+def run_worker(args):
+    """Child process: one main_logic pass over a synthetic catalog, JSON result on stdout."""
+    real_stdout = sys.stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from api import check
+
+        if not args.real_rate_limits:
+            for store in list(check.STORE_RATE_LIMITS):
+                check.STORE_RATE_LIMITS[store] = (1e6, 1_000_000)
+            check.DEFAULT_RATE_LIMIT = (1e6, 1_000_000)
+
+        products = synthetic_catalog(args.size, args.stores.split(","))
+        if not args.no_tracemalloc:
+            tracemalloc.start()
+        started_at = time.time()
+        found, total, summary, extra = check.main_logic(time_budget=args.budget, products=products)
+        wall = time.time() - started_at
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+
+    result = {
+        "size": args.size,
+        "started_at": started_at,
+        "wall_seconds": round(wall, 3),
+        "found": found,
+        "total": total,
+        "skipped": len(extra.get("skipped", [])),
+        "peak_traced_mb": round(peak / 2 ** 20, 2) if peak is not None else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    real_stdout.write(json.dumps(result) + "\n")
+
+def child_env(args, cluster):
+    # No PG* variables, so nothing can reach a real database even if the switch below is bypassed
+    env = {key: value for key, value in os.environ.items() if not key.startswith("PG")}
+    env.update(cluster.env())
+    env.update({
+        "PINCODES_TO_CHECK": args.pincodes,
+        "DATABASE_URL": "",
+        "CHECK_DB_DISABLED": "1",
+        "STOCK_STATE_ENABLED": "0",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AMAZON_PARTNER_TAG": "bench-21",
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_GROUP_ID": "-100",
+        "TELEGRAM_CHAT_RPS": "1000",
+        "TELEGRAM_CHAT_BURST": "1000",
+        "NOTIFY_FLUSH_TIMEOUT": "120",
+    })
+    return env
+
+def run_size(args, cluster, size):
+    cluster.stats.reset()
+    command = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--size", str(size), "--stores", args.stores, "--budget", str(args.budget),
+    ]
+    if args.real_rate_limits:
+        command.append("--real-rate-limits")
+    if args.no_tracemalloc:
+        command.append("--no-tracemalloc")
+    proc = subprocess.run(command, env=child_env(args, cluster), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark worker failed for size {size}:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    stats = cluster.stats.snapshot()
+    requests_sent = sum(stats["requests"].values())
+    result.update({
+        "requests": requests_sent,
+        "requests_per_second": round(requests_sent / result["wall_seconds"], 1) if result["wall_seconds"] else None,
+        "upstream_errors": sum(stats["errors"].values()),
+        "alerts": stats["alerts"],
+        "time_to_first_alert": (
+            round(stats["first_alert_at"] - result["started_at"], 3) if stats["first_alert_at"] else None
+        ),
+        "requests_by_store": stats["requests"],
+    })
+    return result
+
+def print_table(results, baseline=None):
+    columns = [
+        ("size", "size"), ("wall_seconds", "wall s"), ("requests", "requests"),
+        ("requests_per_second", "req/s"), ("found", "found"), ("skipped", "skipped"),
+        ("peak_traced_mb", "peak MB"), ("max_rss_mb", "rss MB"), ("time_to_first_alert", "1st alert s"),
+    ]
+    print("  ".join(f"{title:>11}" for _, title in columns))
+    for result in results:
+        print("  ".join(f"{str(result.get(key)):>11}" for key, _ in columns))
+        previous = (baseline or {}).get(str(result["size"]))
+        if previous:
+            deltas = []
+            for key, title in columns[1:]:
+                old, new = previous.get(key), result.get(key)
+                if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+                    deltas.append(f"{title} {100 * (new - old) / old:+.0f}%")
+            print(f"{'':>11}  vs baseline: " + ", ".join(deltas))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,10000", help="Comma-separated catalog sizes")
+    parser.add_argument("--stores", default=",".join(STUB_STORES), help="Store types in the synthetic catalog")
+    parser.add_argument("--pincodes", default="110016,400001", help="PINCODES_TO_CHECK for the run")
+    parser.add_argument("--latency", default="lognormal:0.05:0.5", help="Default stub latency (fixed:S, uniform:A:B, lognormal:MEDIAN:SIGMA)")
+    parser.add_argument("--store-latency", action="append", default=[], metavar="STORE=SPEC", help="Per-store latency override")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub responses that are 503s")
+    parser.add_argument("--in-stock", type=float, default=0.05, help="Share of (product, pincode) pairs in stock")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--budget", type=float, default=0, help="Run time budget in seconds (0 = none)")
+    parser.add_argument("--real-rate-limits", action="store_true", help="Keep the production per-store rate limits")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip peak memory tracing (it slows the run)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed wall time regression vs baseline")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    latencies = dict(item.split("=", 1) for item in args.store_latency)
+    profiles = {
+        store: StoreProfile(latencies.get(store, args.latency), args.error_rate, args.in_stock, args.seed)
+        for store in STUB_STORES
+    }
+    cluster = StubCluster(profiles).start()
+    results = []
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            print(f"[bench] Running {size} products...", file=sys.stderr)
+            results.append(run_size(args, cluster, size))
+    finally:
+        cluster.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {str(r["size"]): r for r in json.load(f)["results"]}
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+    if baseline:
+        regressed = [
+            r["size"] for r in results
+            if str(r["size"]) in baseline
+            and r["wall_seconds"] > baseline[str(r["size"])]["wall_seconds"] * (1 + args.tolerance)
+        ]
+        if regressed:
+            print(f"[bench] Wall time regressed beyond {args.tolerance:.0%} for sizes: {regressed}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Local stand-ins for every upstream api/check.py talks to.
+
+Each store gets its own ThreadingHTTPServer (so sessions, circuit breakers
+and latency stats stay per host, as in production) that answers in that
+store's response format. Latency, error rate and in-stock ratio are
+configurable per store. Stock is a deterministic function of
+(seed, productId, pincode), so repeated runs see the same catalog state.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STUB_STORES = [
+    "croma", "flipkart", "amazon", "reliance_digital", "iqoo", "vivo", "oppo", "jiomart",
+    "unicorn", "vijay_sales", "sangeetha",
+]
+# Vivo/iQOO SPUs list this many SKUs; the synthetic catalog tracks them all
+SKUS_PER_SPU = 4
+
+def vivo_sku_ids(spu):
+    return [f"{spu}{index}" for index in range(SKUS_PER_SPU)]
+
+def parse_latency(spec):
+    """
+    Parses a latency distribution spec into a sampler returning seconds:
+      fixed:0.05  uniform:0.02:0.2  lognormal:<median>:<sigma>
+    """
+    kind, *params = spec.split(":")
+    params = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "lognormal":
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+class StoreProfile:
+    """How one stub store behaves."""
+
+    def __init__(self, latency="lognormal:0.05:0.5", error_rate=0.0, in_stock_ratio=0.1, seed=0):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.in_stock_ratio = in_stock_ratio
+        self.seed = seed
+
+    def in_stock(self, product_id, pincode=""):
+        digest = hashlib.sha1(f"{self.seed}:{product_id}:{pincode}".encode()).digest()
+        return int.from_bytes(digest[:4], "big") / 2 ** 32 < self.in_stock_ratio
+
+class StubStats:
+    """Request counts per store and the arrival time of the first alert."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.errors = {}
+            self.first_alert_at = None
+            self.alerts = 0
+
+    def count(self, store, error=False):
+        with self.lock:
+            self.requests[store] = self.requests.get(store, 0) + 1
+            if error:
+                self.errors[store] = self.errors.get(store, 0) + 1
+
+    def alert(self):
+        with self.lock:
+            if self.first_alert_at is None:
+                self.first_alert_at = time.time()
+            self.alerts += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "errors": dict(self.errors),
+                "first_alert_at": self.first_alert_at,
+                "alerts": self.alerts,
+            }
+
+def croma_response(profile, body):
+    line = body["promise"]["promiseLines"]["promiseLine"][0]
+    if profile.in_stock(line["itemID"], line["shipToAddress"]["zipCode"]):
+        return {"promise": {"suggestedOption": {"option": {"promiseLines": {"promiseLine": [line]}}}}}
+    return {"promise": {}}
+
+def flipkart_response(profile, body):
+    ids = body.get("productIds") or [body.get("productId")]
+    pincode = body.get("pincode")
+    response = {}
+    for product_id in ids:
+        available = profile.in_stock(product_id, pincode)
+        response[product_id] = {"listingSummary": {
+            "serviceable": available,
+            "available": available,
+            "pricing": {"finalPrice": {"decimalValue": "49999"}},
+        }}
+    return {"RESPONSE": response}
+
+def amazon_response(profile, body):
+    items = []
+    for asin in body.get("ItemIds", []):
+        available = profile.in_stock(asin)
+        items.append({
+            "ASIN": asin,
+            "ItemInfo": {"Title": {"DisplayValue": f"Item {asin}"}},
+            "OffersV2": {"Listings": [{"Availability": {
+                "Type": "IN_STOCK" if available else "OUT_OF_STOCK",
+                "Message": "In stock" if available else "Currently unavailable",
+            }}]},
+        })
+    return {"ItemsResult": {"Items": items}}
+
+def reliance_response(profile, body):
+    return {"available": profile.in_stock(body.get("article_id"), body.get("pincode"))}
+
+def vivo_iqoo_response(profile, path):
+    spu = path.rstrip("/").rsplit("/", 1)[-1]
+    return {"success": "1", "data": {"activitySkuList": [
+        {
+            "skuId": sku_id,
+            "colorName": "Black",
+            "romName": "256GB",
+            "activityInfo": {"reservableId": -1 if profile.in_stock(sku_id) else 0},
+        }
+        for sku_id in vivo_sku_ids(spu)
+    ]}}
+
+def oppo_response(profile, body):
+    pincode = body.get("pincode")
+    return {"data": {"products": [
+        {"skuCode": sku, "deliveryOnlineSupport": profile.in_stock(sku, pincode)}
+        for sku in body.get("skuCodes", [])
+    ]}}
+
+def jiomart_response(profile, path, headers):
+    product_id = path.rstrip("/").rsplit("/", 1)[-1]
+    available = profile.in_stock(product_id, headers.get("pin", ""))
+    return {"status": "success", "data": {
+        "availability_status": "A" if available else "NA",
+        "stock_qty": 5 if available else 0,
+        "selling_price": 19999,
+    }}
+
+def unicorn_response(profile, body):
+    available = profile.in_stock(body.get("option_ids"))
+    return {"data": {"product": {
+        "quantity": 3 if available else 0,
+        "price": 79900,
+        "sku": f"SKU-{body.get('option_ids')}",
+        "custom_column_4": "" if available else "Out of Stock",
+    }}}
+
+def vijay_sales_response(profile, query):
+    pincode = query.get("pincode", [""])[0]
+    van_nos = query.get("vanNo", [""])[0].split(",")
+    return {"data": {
+        van_no: {"isServiceable": profile.in_stock(van_no, pincode), "storePickupList": []}
+        for van_no in van_nos
+    }}
+
+def sangeetha_response(profile, body):
+    """(status, payload): out-of-stock products answer 500, like the real API."""
+    if not profile.in_stock(body.get("product_id"), body.get("pinCode")):
+        return 500, {"message": "product not available"}
+    return 200, {"data": {"product_eta": {"stock_status": "instock", "eta_title": "Tomorrow"}}}
+
+def make_handler(store, profile, stats):
+    rng = random.Random(profile.seed)
+    rng_lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real upstreams
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, payload=None):
+            data = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_request(self, body):
+            with rng_lock:
+                delay = profile.sample_latency(rng)
+                failed = rng.random() < profile.error_rate
+            time.sleep(max(0.0, delay))
+            stats.count(store, error=failed)
+            if failed:
+                return self.reply(503, {"error": "stub failure"})
+
+            parsed = urlparse(self.path)
+            path = parsed.path
+            status = 200
+            if store == "croma":
+                payload = croma_response(profile, body)
+            elif store == "flipkart":
+                payload = flipkart_response(profile, body)
+            elif store == "amazon":
+                payload = amazon_response(profile, body)
+            elif store == "reliance_digital":
+                payload = reliance_response(profile, body)
+            elif store in ("vivo", "iqoo"):
+                payload = vivo_iqoo_response(profile, path)
+            elif store == "oppo":
+                payload = oppo_response(profile, body)
+            elif store == "jiomart":
+                payload = jiomart_response(profile, path, self.headers)
+            elif store == "unicorn":
+                payload = unicorn_response(profile, body)
+            elif store == "vijay_sales":
+                payload = vijay_sales_response(profile, parse_qs(parsed.query))
+            elif store == "sangeetha":
+                status, payload = sangeetha_response(profile, body)
+            elif store == "telegram":
+                if re.search(r"/sendMessage$", path):
+                    stats.alert()
+                payload = {"ok": True, "result": {}}
+            else:  # whatsapp
+                payload = {"ok": True}
+            self.reply(status, payload)
+
+        def do_GET(self):
+            self.handle_request({})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = {}
+            self.handle_request(body)
+
+    return StubHandler
+
+class StubCluster:
+    """Starts one stub server per store plus Telegram and WhatsApp sinks."""
+
+    def __init__(self, profiles, notify_latency="fixed:0.02"):
+        self.stats = StubStats()
+        self.servers = {}
+        sinks = {"telegram": StoreProfile(notify_latency), "whatsapp": StoreProfile(notify_latency)}
+        for store, profile in {**profiles, **sinks}.items():
+            server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(store, profile, self.stats))
+            server.daemon_threads = True
+            self.servers[store] = server
+
+    def start(self):
+        for server in self.servers.values():
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def base(self, store):
+        return f"http://127.0.0.1:{self.servers[store].server_port}"
+
+    def env(self):
+        """Environment overrides pointing api/check.py at these stubs."""
+        return {
+            "CROMA_INVENTORY_URL": f"{self.base('croma')}/inventory/",
+            "FLIPKART_PROXY_URL": f"{self.base('flipkart')}/flipkart_check",
+            "AMAZON_ENDPOINT": f"{self.base('amazon')}/paapi5/getitems",
+            "RELIANCE_WORKER_URL": f"{self.base('reliance_digital')}/",
+            "VIVO_BASE_URL": f"{self.base('vivo')}/in",
+            "IQOO_BASE_URL": f"{self.base('iqoo')}/in",
+            "OPPO_SERVICEABILITY_URL": f"{self.base('oppo')}/fetch",
+            "JIOMART_PRODUCT_URL": f"{self.base('jiomart')}/catalog/productdetails/get/{{product_id}}",
+            "UNICORN_PRODUCT_URL": f"{self.base('unicorn')}/get_product_by_option_id",
+            "VIJAY_SALES_SERVICEABILITY_URL": f"{self.base('vijay_sales')}/web/api/oms/check-servicibility/v1",
+            "SANGEETHA_ETA_URL": f"{self.base('sangeetha')}/b/customer/api/v3/product-eta-details",
+            "TELEGRAM_API_URL": self.base("telegram"),
+            "WHATSAPP_API_URL": f"{self.base('whatsapp')}/whatsapp/send",
+        }
@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "products" ADD COLUMN "last_checked_at" TIMESTAMP(3);
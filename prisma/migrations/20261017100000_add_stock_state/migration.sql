@@ -0,0 +1,13 @@
+-- CreateTable
+CREATE TABLE "stock_state" (
+    "product_id" INTEGER NOT NULL,
+    "pincode" TEXT NOT NULL DEFAULT '',
+    "in_stock" BOOLEAN NOT NULL DEFAULT false,
+    "price" TEXT,
+    "updated_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "stock_state_pkey" PRIMARY KEY ("product_id","pincode")
+);
+
+-- AddForeignKey
+ALTER TABLE "stock_state" ADD CONSTRAINT "stock_state_product_id_fkey" FOREIGN KEY ("product_id") REFERENCES "products"("id") ON DELETE CASCADE ON UPDATE CASCADE;
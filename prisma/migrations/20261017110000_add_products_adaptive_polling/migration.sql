@@ -0,0 +1,4 @@
+-- AlterTable
+ALTER TABLE "products" ADD COLUMN     "next_check_at" TIMESTAMP(3),
+ADD COLUMN     "poll_interval_seconds" INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN     "volatility" DOUBLE PRECISION NOT NULL DEFAULT 0;
@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "products_store_type_next_check_at_idx" ON "products"("store_type", "next_check_at");
@@ -0,0 +1,10 @@
+-- CreateTable
+CREATE TABLE "endpoint_health" (
+    "endpoint" TEXT NOT NULL,
+    "state" TEXT NOT NULL DEFAULT 'closed',
+    "consecutive_failures" INTEGER NOT NULL DEFAULT 0,
+    "opened_at" TIMESTAMP(3),
+    "updated_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "endpoint_health_pkey" PRIMARY KEY ("endpoint")
+);
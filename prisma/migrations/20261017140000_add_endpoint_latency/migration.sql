@@ -0,0 +1,11 @@
+-- CreateTable
+CREATE TABLE "endpoint_latency" (
+    "endpoint" TEXT NOT NULL,
+    "samples" DOUBLE PRECISION[],
+    "p50" DOUBLE PRECISION,
+    "p90" DOUBLE PRECISION,
+    "p99" DOUBLE PRECISION,
+    "updated_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "endpoint_latency_pkey" PRIMARY KEY ("endpoint")
+);
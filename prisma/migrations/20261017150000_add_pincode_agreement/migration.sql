@@ -0,0 +1,12 @@
+-- CreateTable
+CREATE TABLE "pincode_agreement" (
+    "store_type" TEXT NOT NULL,
+    "pincode_a" TEXT NOT NULL,
+    "pincode_b" TEXT NOT NULL,
+    "agree" INTEGER NOT NULL DEFAULT 0,
+    "agree_in_stock" INTEGER NOT NULL DEFAULT 0,
+    "disagree" INTEGER NOT NULL DEFAULT 0,
+    "updated_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "pincode_agreement_pkey" PRIMARY KEY ("store_type","pincode_a","pincode_b")
+);
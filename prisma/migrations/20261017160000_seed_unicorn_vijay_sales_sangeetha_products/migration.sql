@@ -0,0 +1,25 @@
+-- Unicorn, Vijay Sales and Sangeetha were checked from hard-coded lists.
+-- They are regular store types now; seed those variants as products.
+-- Unicorn product_id: "<color option id>,<storage option id>"; Vijay Sales: vanNo.
+INSERT INTO "products" ("name", "url", "product_id", "store_type")
+SELECT v."name", v."url", v."product_id", v."store_type"
+FROM (VALUES
+    ('iPhone 17 Lavender 256GB', 'https://shop.unicornstore.in/iphone-17', '313,250', 'unicorn'),
+    ('iPhone 17 Sage 256GB', 'https://shop.unicornstore.in/iphone-17', '311,250', 'unicorn'),
+    ('iPhone 17 Mist Blue 256GB', 'https://shop.unicornstore.in/iphone-17', '312,250', 'unicorn'),
+    ('iPhone 17 White 256GB', 'https://shop.unicornstore.in/iphone-17', '314,250', 'unicorn'),
+    ('iPhone 17 Black 256GB', 'https://shop.unicornstore.in/iphone-17', '315,250', 'unicorn'),
+    ('iPhone 17 Mist Blue 256GB', 'https://www.vijaysales.com/p/P245179/245181/apple-iphone-17-256gb-storage-mist-blue', '245181', 'vijay_sales'),
+    ('iPhone 17 Black 256GB', 'https://www.vijaysales.com/p/P245179/245179/apple-iphone-17-256gb-storage-black', '245179', 'vijay_sales'),
+    ('iPhone 17 White 256GB', 'https://www.vijaysales.com/p/P245179/245180/apple-iphone-17-256gb-storage-white', '245180', 'vijay_sales'),
+    ('iPhone 17 Lavender 256GB', 'https://www.vijaysales.com/p/P245179/245182/apple-iphone-17-256gb-storage-lavender', '245182', 'vijay_sales'),
+    ('iPhone 17 Sage 256GB', 'https://www.vijaysales.com/p/P245179/245183/apple-iphone-17-256gb-storage-sage', '245183', 'vijay_sales'),
+    ('iPhone 17 Sage', 'https://www.sangeethamobiles.com/product-details/19685', '19685', 'sangeetha'),
+    ('iPhone 17 Lavender', 'https://www.sangeethamobiles.com/product-details/19681', '19681', 'sangeetha'),
+    ('iPhone 17 White', 'https://www.sangeethamobiles.com/product-details/19678', '19678', 'sangeetha'),
+    ('iPhone 17 Black', 'https://www.sangeethamobiles.com/product-details/19680', '19680', 'sangeetha'),
+    ('iPhone 17 Blue', 'https://www.sangeethamobiles.com/product-details/19683', '19683', 'sangeetha')
+) AS v("name", "url", "product_id", "store_type")
+WHERE NOT EXISTS (
+    SELECT 1 FROM "products" p WHERE p."store_type" = v."store_type" AND p."product_id" = v."product_id"
+);
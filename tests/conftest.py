@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+import check  # noqa: E402
+
+
+class FakeResponse:
+    """Just enough of requests.Response for the store checkers."""
+
+    def __init__(self, status_code=200, payload=None, text=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = text if text is not None else ("" if payload is None else repr(payload))
+        self.headers = {}
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        if self.payload is None:
+            raise ValueError("Expecting value: line 1 column 1 (char 0)")
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise check.requests.exceptions.HTTPError(f"{self.status_code} Error", response=self)
+
+
+def make_product(product_id, store_type="flipkart", **fields):
+    product = {
+        "id": None,
+        "name": f"Product {product_id}",
+        "url": f"https://example.com/{product_id}",
+        "affiliateLink": None,
+        "productId": product_id,
+        "storeType": store_type,
+    }
+    product.update(fields)
+    return product
+
+
+@pytest.fixture
+def fake_http(monkeypatch):
+    """Replaces check.http_request with a function returning the queued responses in order."""
+    responses = []
+
+    def http_request(store_type, method, url, **kwargs):
+        return responses.pop(0)
+
+    monkeypatch.setattr(check, "http_request", http_request)
+    return responses
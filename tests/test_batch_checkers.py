@@ -0,0 +1,86 @@
+import threading
+
+import check
+from conftest import FakeResponse, make_product
+
+
+def run_in_fresh_thread(func, *args):
+    """Runs func where no engine call has ever set up the per-thread outcome state."""
+    box = {}
+
+    def target():
+        try:
+            box["result"] = func(*args)
+        except Exception as e:
+            box["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
+
+
+def flipkart_listing(available):
+    return {"listingSummary": {"serviceable": available, "available": available}}
+
+
+def test_flipkart_batch_outside_engine_tolerates_missing_product(fake_http, monkeypatch):
+    monkeypatch.setattr(check, "FLIPKART_BATCH_SIZE", 5)
+    fake_http.append(FakeResponse(payload={"RESPONSE": {"A": flipkart_listing(True)}}))
+    products = [make_product("A"), make_product("B")]
+
+    results = run_in_fresh_thread(check.check_flipkart_batch, products, "110016")
+
+    assert results[0] and results[1] is None
+
+
+def test_missing_product_fails_only_that_product(fake_http, monkeypatch):
+    monkeypatch.setattr(check, "FLIPKART_BATCH_SIZE", 5)
+    fake_http.append(FakeResponse(payload={"RESPONSE": {"A": flipkart_listing(False)}}))
+    products = [make_product("A"), make_product("B")]
+
+    results, failed = check.call_with_outcome(check.check_flipkart_batch, products, "110016")
+
+    assert results == [None, None]
+    assert failed == [False, True]
+
+
+def test_amazon_asin_missing_from_items_result_is_failed(fake_http, monkeypatch):
+    for name in ("AMAZON_ACCESS_KEY", "AMAZON_SECRET_KEY", "AMAZON_PARTNER_TAG"):
+        monkeypatch.setattr(check, name, "test")
+    in_stock = {"ASIN": "A1", "OffersV2": {"Listings": [{"Availability": {"Type": "IN_STOCK"}}]}}
+    fake_http.append(FakeResponse(payload={
+        "ItemsResult": {"Items": [in_stock]},
+        "Errors": [{"Code": "ItemNotAccessible", "Message": "A3 is not accessible"}],
+    }))
+    products = [make_product(asin, store_type="amazon") for asin in ("A1", "A2", "A3")]
+
+    results, failed = check.call_with_outcome(check.check_amazon_batch, products)
+
+    assert results[0] and results[1:] == [None, None]
+    assert failed == [False, True, True]
+
+
+def test_oppo_sku_missing_from_answer_is_failed(fake_http):
+    fake_http.append(FakeResponse(payload={"data": {"products": [
+        {"skuCode": "S1", "deliveryOnlineSupport": True},
+        {"skuCode": "S2", "deliveryOnlineSupport": False},
+    ]}}))
+    products = [make_product(sku, store_type="oppo") for sku in ("S1", "S2", "S3")]
+
+    results, failed = check.call_with_outcome(check.check_oppo_batch, products, "110016")
+
+    assert results[0] and results[1:] == [None, None]
+    assert failed == [False, False, True]
+
+
+def test_oppo_null_data_fails_every_sku(fake_http):
+    fake_http.append(FakeResponse(payload={"data": None}))
+    products = [make_product(sku, store_type="oppo") for sku in ("S1", "S2")]
+
+    results, failed = check.call_with_outcome(check.check_oppo_batch, products, "110016")
+
+    assert results == [None, None]
+    assert failed == [True, True]
@@ -0,0 +1,34 @@
+import check
+
+
+def test_health_before_first_success_is_unhealthy():
+    status = check.DaemonStatus()
+    assert status.health()[0] is False
+
+    status.record_failure(RuntimeError("db down"))
+    healthy, report = status.health()
+    assert healthy is False and report["status"] == "starting"
+
+
+def test_health_after_consecutive_failures(monkeypatch):
+    monkeypatch.setattr(check, "DAEMON_MAX_CONSECUTIVE_FAILURES", 3)
+    status = check.DaemonStatus()
+    status.record_tick(0, 1, 2, {})
+    assert status.health()[0] is True
+
+    for _ in range(3):
+        status.record_failure(RuntimeError("db down"))
+    healthy, report = status.health()
+    assert healthy is False and report["status"] == "failing"
+
+    status.record_tick(0, 1, 2, {})
+    assert status.health()[0] is True
+
+
+def test_health_when_last_success_is_stale(monkeypatch):
+    status = check.DaemonStatus()
+    status.record_tick(0, 1, 2, {})
+    status.last_success_at -= check.DAEMON_STALE_SECONDS + 1
+
+    healthy, report = status.health()
+    assert healthy is False and report["status"] == "stale"
@@ -0,0 +1,15 @@
+import pytest
+
+import check
+
+
+def test_disabled_database_is_never_contacted(monkeypatch):
+    monkeypatch.setattr(check, "CHECK_DB_DISABLED", True)
+    monkeypatch.setattr(check, "_db_conn", None)
+    monkeypatch.setattr(check.psycopg2, "connect", lambda *args, **kwargs: pytest.fail("connected to the database"))
+
+    with pytest.raises(RuntimeError):
+        with check.db_cursor("test"):
+            pass
+    with pytest.raises(RuntimeError):
+        check.save_check_schedule([(1, 0, 0.0)])
@@ -0,0 +1,54 @@
+import threading
+
+import check
+
+
+def test_sends_left_after_flush_are_cancelled_or_saved_late(monkeypatch):
+    saved = []
+    monkeypatch.setattr(check, "save_stock_state", lambda rows: saved.extend(rows))
+    dispatcher = check.NotificationDispatcher(workers=1, queue_size=10)
+    release = threading.Event()
+    sent = []
+
+    def slow_send(parts):
+        release.wait(5)
+        sent.extend(parts)
+        return []
+
+    def send(parts):
+        sent.extend(parts)
+        return []
+
+    running = ([dispatcher.submit(slow_send, ["A alert"])], ["A alert"], [("A alert", [(1, "", True, None)])])
+    queued = ([dispatcher.submit(send, ["B alert"])], ["B alert"], [("B alert", [(2, "", True, None)])])
+    assert dispatcher.flush(timeout=0.05) is False
+
+    assert check.delivered_state_rows([running, queued]) == []
+    release.set()
+    assert dispatcher.flush(timeout=5) is True
+
+    assert sent == ["A alert"]
+    assert saved == [(1, "", True, None)]
+
+
+def test_delivered_parts_save_their_products():
+    done = check.concurrent.futures.Future()
+    done.set_result(["part 2: B alert"])
+    held = [("A alert", [(1, "", True, None)]), ("B alert", [(2, "", True, None)])]
+
+    rows = check.delivered_state_rows([([done], ["A alert", "part 2: B alert"], held)])
+
+    assert rows == [(1, "", True, None)]
+
+
+def test_pack_messages_keeps_sections_with_equal_headings_apart():
+    messages = check.pack_messages("H\n", [("", ["a"], " | "), ("", ["b"], " | ")])
+
+    assert messages == ["H\na\n\nb"]
+
+
+def test_pack_messages_repeats_heading_in_continuation():
+    heading = "".join(["*Now ", "out:*\n"])
+    messages = check.pack_messages("H\n", [(heading, ["x" * 10, "y" * 10], "\n")], limit=30)
+
+    assert messages == [f"H\n{heading}{'x' * 10}", f"H\n{heading}{'y' * 10}"]
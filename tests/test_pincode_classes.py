@@ -0,0 +1,17 @@
+import check
+from conftest import make_product
+
+
+def test_cache_only_serves_pincodes_standing_in_for_a_class(monkeypatch):
+    monkeypatch.setattr(check, "_pincode_results", {})
+    monkeypatch.setattr(check, "PINCODE_RESULT_TTL", 5)
+    product = make_product("P1", store_type="croma")
+    engine = check.CheckEngine(pincode_classes=check.PincodeClasses({}))
+    check.cache_pincode_result("croma", "P1", "110016", "in stock")
+
+    assert engine.cached_result("croma", product, "110016") is None
+    assert engine.cached_result("croma", product, "110016", ["110017"]) == ("in stock", False)
+
+
+def test_result_ttl_is_shorter_than_a_daemon_tick():
+    assert check.PINCODE_RESULT_TTL < check.DAEMON_MIN_TICK_SECONDS
@@ -0,0 +1,61 @@
+import pytest
+
+import check
+from conftest import FakeResponse, make_product
+
+PINCODE = "110016"
+CHALLENGE_PAGE = "<html><body>Access denied</body></html>"
+
+
+@pytest.fixture
+def sent_alerts(monkeypatch):
+    alerts = []
+    monkeypatch.setattr(check, "send_alert", lambda messages, **kwargs: alerts.append(messages) or [])
+    return alerts
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Answers every store request with the response set on the returned dict."""
+    answer = {}
+    monkeypatch.setattr(check, "HEDGED_STORES", set())
+    monkeypatch.setattr(check, "timed_request", lambda store_type, method, url, **kwargs: answer["response"])
+    return answer
+
+
+def run_in_stock_product(store_type):
+    """Checks one product stored as in stock at PINCODE and returns (engine, product)."""
+    product = make_product("P1", store_type=store_type, id=1, url="https://example.com/P1?skuId=7")
+    engine = check.CheckEngine(previous_state={1: {PINCODE: (True, None)}})
+    engine.run({store_type: [product]}, [PINCODE])
+    return engine, product
+
+
+@pytest.mark.parametrize("store_type", ["croma", "flipkart", "jiomart", "reliance_digital", "vivo"])
+def test_forbidden_page_keeps_stock_state(store_type, upstream, sent_alerts):
+    upstream["response"] = FakeResponse(403, text=CHALLENGE_PAGE)
+
+    engine, product = run_in_stock_product(store_type)
+
+    assert sent_alerts == []
+    assert engine.state_rows == [] and engine.pending_alerts == []
+    assert engine.changes[id(product)] is None
+
+
+def test_unparseable_answer_keeps_stock_state(upstream, sent_alerts):
+    upstream["response"] = FakeResponse(200, text=CHALLENGE_PAGE)
+
+    engine, product = run_in_stock_product("croma")
+
+    assert sent_alerts == []
+    assert engine.state_rows == []
+    assert engine.changes[id(product)] is None
+
+
+def test_confirmed_out_of_stock_is_alerted(upstream, sent_alerts):
+    upstream["response"] = FakeResponse(200, payload={"promise": {}})
+
+    engine, product = run_in_stock_product("croma")
+
+    assert len(sent_alerts) == 1 and "Now out of stock" in sent_alerts[0][0]
+    assert engine.changes[id(product)] is True